@@ -1,33 +1,40 @@
+from __future__ import annotations
 import itertools
+from contextlib import contextmanager
+
+from pathos.pools import ProcessPool
 
 
 # helper functions
 
 # returns a list of all injections, modeled as dicts
-from typing import Dict
+from typing import Dict, Iterator
 
 
 def injections(source, target):
-    if len(source) == 0:
-        return [{}]
-    if len(target) == 0:
-        return []
-    output = []
-    for index, image in enumerate(target):
-        output.extend([copy_and_add(injection, source[0], image) for injection
-                       in injections(source[1:], target[:index] + target[index + 1:])])
-    return output
+    return list(iter_injections(source, target))
+
+
+# yields all injections source -> target, modeled as dicts, in the order injections() lists them
+def iter_injections(source, target) -> Iterator[Dict]:
+    for images in itertools.permutations(target, len(source)):
+        yield dict(zip(source, images))
 
 
 # returns a list of all partial bijections, modeled as dicts
 # if specified, r is the size of the image (= size of the coimage)
 def partial_bijections(source, target, r=None):
+    return list(iter_partial_bijections(source, target, r))
+
+
+# yields all partial bijections, in the order partial_bijections() lists them
+def iter_partial_bijections(source, target, r=None) -> Iterator[Dict]:
     if r is not None and r < 0:
-        return []
-    output = []
-    for sublist in sublists(source, r):
-        output.extend(injections(sublist, target))
-    return output
+        return
+    sizes = range(len(source) + 1) if r is None else [r]
+    for size in sizes:
+        for sublist in itertools.combinations(source, size):
+            yield from iter_injections(sublist, target)
 
 
 def is_injection(f):
@@ -93,3 +100,69 @@ def simplify_coefficients(coefficients: Dict) -> Dict:
         if c == c.ring.zero():
             del new_coefficients[g]
     return new_coefficients
+
+
+# builds up a sum of elements in place, instead of copying the whole sum for every term added
+# build - makes the final element out of its {generator: Z2Polynomial} coefficients
+class Accumulator:
+    def __init__(self, build):
+        self.build = build
+        self.coefficients = {}
+
+    # adds every term of element, which is anything with a coefficients dict
+    def add(self, element) -> None:
+        for g, c in element.coefficients.items():
+            self.add_term(g, c)
+
+    def add_term(self, g, c) -> None:
+        if g in self.coefficients:
+            c = self.coefficients[g] + c
+        if c.is_zero():
+            self.coefficients.pop(g, None)
+        else:
+            self.coefficients[g] = c
+
+    def __iadd__(self, element) -> Accumulator:
+        self.add(element)
+        return self
+
+    def freeze(self):
+        return self.build(self.coefficients)
+
+
+# the rank over Z/2 of a list of vectors, each given as a bitset (bit i is the i-th entry)
+# this is Gaussian elimination, keyed on the highest set bit of each pivot
+def gf2_rank(vectors) -> int:
+    pivots = {}
+    for v in vectors:
+        while v:
+            top = v.bit_length() - 1
+            if top in pivots:
+                v ^= pivots[top]
+            else:
+                pivots[top] = v
+                break
+    return len(pivots)
+
+
+# a pool of the given number of worker processes, shut down again when the with block ends
+# pass it to parallel_map() to run several maps on the same processes
+@contextmanager
+def process_pool(workers: int):
+    pool = ProcessPool(nodes=workers)
+    try:
+        yield pool
+    finally:
+        pool.close()
+        pool.join()
+        pool.clear()
+
+
+# [f(*args) for args in zip(*arg_lists)], computed on the given pool, or else on a new pool of the given number of
+# worker processes
+# the output is in the same order as the input, however the work is scheduled
+def parallel_map(f, *arg_lists, workers: int = None, pool=None):
+    if pool is not None:
+        return pool.map(f, *arg_lists)
+    with process_pool(workers) as pool:
+        return pool.map(f, *arg_lists)
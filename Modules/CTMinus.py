@@ -1,43 +1,186 @@
 from __future__ import annotations
 import itertools
+import math
+from contextlib import nullcontext
+from typing import List, Optional, Dict, Iterator, Callable
 
-from multimethod import multimethod
-
-from Functions.Functions import swap_values, injections, partial_bijections
+from Functions.Functions import swap_values, iter_injections, iter_partial_bijections, parallel_map, \
+    process_pool
 from Modules.ETangleStrands import ETangleStrands
 from Modules.Module import Module
 from Modules.StrandDiagram import StrandDiagram
-from Modules.TypeDA import TypeDA
+from Modules.TypeDA import TypeDA, TensorStats
+from Modules.TypeDACache import TypeDACache
 from SignAlgebra.AMinus import AMinus
 from Tangles.Tangle import Tangle, ETangle
 
 
-def reduced_type_da(tangle: Tangle) -> TypeDA:
-    components = []
-    for i in range(len(tangle.right_points()) + 1):
-        components += [reduced_type_da_in_right_grading(tangle, i)]
-    return TypeDA.direct_sum(components)
+# workers - the number of processes to compute the right gradings in; 1 computes them one after another
+# cache - where to look up and store the reduced structures of the elementary pieces, if anywhere
+# streaming, order - see reduced_type_da_in_right_grading()
+def reduced_type_da(tangle: Tangle, workers: int = 1, cache: Optional[TypeDACache] = None,
+                    streaming: bool = True, order: str = 'fold') -> TypeDA:
+    gradings = list(range(len(tangle.right_points()) + 1))
+    if workers == 1:
+        components = []
+        for i in gradings:
+            components += [reduced_type_da_in_right_grading(tangle, i, cache, streaming, order)]
+        return TypeDA.direct_sum(components)
+
+    results = parallel_map(reduced_type_da_in_right_grading_records, [tangle] * len(gradings), gradings,
+                           [cache] * len(gradings), [streaming] * len(gradings), [order] * len(gradings),
+                           workers=workers)
+    # every component is read back over the ring and algebras of the first one, so that they can be combined
+    template = results[0][0]
+    return TypeDA.direct_sum([template.empty_copy().add_records(records) for _, records in results])
+
+
+# reduced_type_da_in_right_grading() as (an empty module over the same ring, records), to send between processes
+def reduced_type_da_in_right_grading_records(tangle: Tangle, i: int, cache: Optional[TypeDACache] = None,
+                                              streaming: bool = True, order: str = 'fold'):
+    out = reduced_type_da_in_right_grading(tangle, i, cache, streaming, order)
+    return out.empty_copy(), out.to_records()
+
+
+TENSOR_ORDERS = ('fold', 'tree', 'auto')
 
 
 # returns the reduced CT^-_i for this tangle
-def reduced_type_da_in_right_grading(tangle: Tangle, i: int) -> TypeDA:
-    r = left_occupied_points(tangle, i)
-    etangle = tangle.etangles[0]
+# streaming - if True, each tensor product is reduced while it is built (see TypeDA.tensor), rather than after
+# order - how to associate the tensor product of the pieces, one of TENSOR_ORDERS:
+#   'fold' - from the left, ((DA1 ** DA2) ** DA3) ** ...
+#   'tree' - neighbouring pieces in pairs, then neighbouring products in pairs, and so on
+#   'auto' - whichever tensor_order_costs() expects to finish first, going by JobPlan.piece_idempotent_counts()
+# workers - the number of processes to compute the structure maps of each piece, and the products of one level of the
+#   tree, in. one pool of them is shared by all of these
+# chunk_size - see type_da_in_left_grading()
+def reduced_type_da_in_right_grading(tangle: Tangle, i: int, cache: Optional[TypeDACache] = None,
+                                     streaming: bool = True, order: str = 'fold', workers: int = 1,
+                                     chunk_size: int = 64) -> TypeDA:
+    assert order in TENSOR_ORDERS, f"unknown tensor order {order}"
+    if order == 'auto':
+        from Modules.JobPlan import piece_idempotent_counts
+        costs = tensor_order_costs(piece_idempotent_counts(tangle, i, cache), workers)
+        order = min(costs, key=costs.get)
+        print(f"estimated costs {costs}, using {order}")
+
+    with process_pool(workers) if workers != 1 else nullcontext() as pool:
+        # the pieces are only built as they are needed, so that folding holds one of them at a time
+        pieces = (reduced_type_da_in_left_grading(etangle, r, cache, workers, chunk_size, pool)
+                  for etangle, r in zip(tangle.etangles, piece_left_occupied_points(tangle, i)))
+
+        if order == 'fold':
+            out = next(pieces)
+            for da in pieces:
+                out = tensor_and_reduce(out, da, streaming)
+            return out
+
+        pieces = list(pieces)
+        while len(pieces) > 1:
+            pairs = [(pieces[k], pieces[k + 1]) for k in range(0, len(pieces) - 1, 2)]
+            if pool is None:
+                products = [tensor_and_reduce(m, n, streaming) for m, n in pairs]
+            else:
+                results = parallel_map(tensor_and_reduce_records,
+                                       [(m.empty_copy(), m.to_records()) for m, _ in pairs],
+                                       [(n.empty_copy(), n.to_records()) for _, n in pairs],
+                                       [streaming] * len(pairs), pool=pool)
+                products = [template.empty_copy().add_records(records) for template, records in results]
+            pieces = products + pieces[2 * len(pairs):]
+        return pieces[0]
+
+
+def tensor_and_reduce(m: TypeDA, n: TypeDA, streaming: bool = True) -> TypeDA:
+    print("tensoring...")
+    stats = TensorStats()
+    out = m.tensor(n, stats, reduce=streaming)
+    print(stats)
+    if not streaming:
+        print("reducing...")
+        out = out.reduce()
+    return out
+
+
+# tensor_and_reduce() on modules given as (an empty module over the right ring, records), to send between processes
+def tensor_and_reduce_records(m, n, streaming: bool = True):
+    m_template, m_records = m
+    n_template, n_records = n
+    out = tensor_and_reduce(m_template.empty_copy().add_records(m_records),
+                            n_template.empty_copy().add_records(n_records), streaming)
+    return out.empty_copy(), out.to_records()
+
+
+# {left idempotent points: {right idempotent points: the number of generators of m with those idempotents}}
+def idempotent_counts(m: TypeDA) -> Dict:
+    out = {}
+    for x in m.graph.nodes:
+        row = out.setdefault(tuple(sorted(x.left_idempotent.strands)), {})
+        right = tuple(sorted(x.right_idempotent.strands))
+        row[right] = row.get(right, 0) + 1
+    return out
+
+
+# the idempotent_counts() of m ** n, computed from those of m and n
+def multiply_idempotent_counts(m_counts: Dict, n_counts: Dict) -> Dict:
+    out = {}
+    for left, m_row in m_counts.items():
+        row = {}
+        for middle, m_count in m_row.items():
+            for right, n_count in n_counts.get(middle, {}).items():
+                row[right] = row.get(right, 0) + m_count * n_count
+        if row:
+            out[left] = row
+    return out
+
+
+# estimates how long multiplying out the pieces takes in each order, as {order: cost}
+def estimate_tensor_order_costs(pieces: List[TypeDA], workers: int = 1) -> Dict[str, int]:
+    return tensor_order_costs([idempotent_counts(piece) for piece in pieces], workers)
+
+
+# estimate_tensor_order_costs() for pieces with the given idempotent_counts()
+# a product m ** n is taken to cost as much as the number of pairs of generators it visits, which is read off the
+# idempotents of the generators of m and n; products are assumed not to shrink when reduced, so the estimates are
+# upper bounds. the products of one level of the tree are spread over the workers
+def tensor_order_costs(counts: List[Dict], workers: int = 1) -> Dict[str, int]:
+    fold_cost = 0
+    out = counts[0]
+    for n_counts in counts[1:]:
+        out = multiply_idempotent_counts(out, n_counts)
+        fold_cost += sum(sum(row.values()) for row in out.values())
+
+    tree_cost = 0
+    while len(counts) > 1:
+        products = [multiply_idempotent_counts(counts[k], counts[k + 1]) for k in range(0, len(counts) - 1, 2)]
+        costs = [sum(sum(row.values()) for row in product.values()) for product in products]
+        tree_cost += max(max(costs), -(-sum(costs) // workers))
+        counts = products + counts[2 * len(products):]
+
+    return {'fold': fold_cost, 'tree': tree_cost}
+
+
+# type_da_in_left_grading(etangle, r, workers, chunk_size, pool), reduced, read from the cache if it is there
+def reduced_type_da_in_left_grading(etangle: ETangle, r: int, cache: Optional[TypeDACache] = None,
+                                    workers: int = 1, chunk_size: int = 64, pool=None) -> TypeDA:
+    if cache is not None:
+        records = cache.get(etangle, r, True)
+        if records is not None:
+            return empty_type_da(etangle).add_records(records)
     print(f"computing da structure for {etangle} in grading {r}...")
-    out = type_da_in_left_grading(etangle, r)
+    out = type_da_in_left_grading(etangle, r, workers, chunk_size, pool)
     print("reducing...")
     out = out.reduce_component()
-    r = len(etangle.right_points()) - (len(etangle.middle_points()) - r)
-    for etangle in tangle.etangles[1:]:
-        print(f"computing da structure for {etangle} in grading {r}...")
-        da = type_da_in_left_grading(etangle, r)
-        print("reducing...")
-        da = da.reduce_component()
-        print("tensoring...")
-        out = (out ** da)
-        print("reducing...")
-        out = out.reduce()
-        r = len(etangle.right_points()) - (len(etangle.middle_points()) - r)
+    if cache is not None:
+        cache.put(etangle, r, True, out.to_records())
+    return out
+
+
+# [the number of occupied points on the left of each etangle of tangle], given i, the number of occupied points on the
+# right of tangle
+def piece_left_occupied_points(tangle: Tangle, i: int) -> List[int]:
+    out = [left_occupied_points(tangle, i)]
+    for etangle in tangle.etangles[:-1]:
+        out += [len(etangle.right_points()) - (len(etangle.middle_points()) - out[-1])]
     return out
 
 
@@ -49,21 +192,63 @@ def left_occupied_points(tangle: Tangle, i: int):
     return r
 
 
-def type_da(etangle: ETangle) -> TypeDA:
-    components = [type_da_in_left_grading(etangle, r) for r in range(0, len(etangle.left_points()) + 1)]
-    return TypeDA.direct_sum(components)
+# workers - the number of processes to compute the generators and structure maps in; 1 computes them one after
+#   another
+# chunk_size - see type_da_in_left_grading()
+# the chunks of every left grading are handed to one pool together, so that the gradings are computed at the same
+# time, and the pieces of each grading are put back together and combined with TypeDA.direct_sum
+def type_da(etangle: ETangle, workers: int = 1, chunk_size: int = 64) -> TypeDA:
+    gradings = list(range(0, len(etangle.left_points()) + 1))
+    if workers == 1:
+        return TypeDA.direct_sum([type_da_in_left_grading(etangle, r) for r in gradings])
 
+    chunks = [(r, keys) for r in gradings for keys in generator_key_chunks(etangle, r, chunk_size)]
+    with process_pool(workers) as pool:
+        results = parallel_map(type_da_chunk_records, [etangle] * len(chunks), [keys for _, keys in chunks],
+                               pool=pool)
+    results_by_grading = {r: [] for r in gradings}
+    for (r, _), result in zip(chunks, results):
+        results_by_grading[r] += [result]
+    return TypeDA.direct_sum([type_da_from_chunk_records(etangle, results_by_grading[r]) for r in gradings])
 
-def type_da_in_left_grading(etangle: ETangle, i: int) -> TypeDA:
-    out = TypeDA(etangle.ring, etangle.left_algebra, etangle.right_algebra,
-                 etangle.left_scalar_action, etangle.right_scalar_action)
+
+# a label for Module.to_agraph() showing the strands the generator keys of a structure built from tangle stand for
+# the keys of a tensor product are nested pairs of the keys of its pieces, in the order of tangle.etangles
+def strands_label(tangle: Tangle) -> Callable:
+    def flatten(key) -> List[int]:
+        return [k for part in key for k in flatten(part)] if isinstance(key, tuple) else [key]
+
+    def label(key) -> str:
+        keys = flatten(key)
+        assert len(keys) == len(tangle.etangles), f"{key} is not a key of a structure built from {tangle}"
+        return ' '.join(str(ETangleStrands.from_key(etangle, k)) for etangle, k in zip(tangle.etangles, keys))
+
+    return label
+
+
+def empty_type_da(etangle: ETangle) -> TypeDA:
+    return TypeDA(etangle.ring, etangle.left_algebra, etangle.right_algebra,
+                  etangle.left_scalar_action, etangle.right_scalar_action)
+
+
+# workers - the number of processes to compute the generators and structure maps in; 1 computes them one after
+#   another
+# chunk_size - the number of generators each worker handles at a time
+# pool - a process_pool() to run on instead of starting a new one
+def type_da_in_left_grading(etangle: ETangle, i: int, workers: int = 1, chunk_size: int = 64, pool=None) -> TypeDA:
+    if workers != 1 or pool is not None:
+        chunks = generator_key_chunks(etangle, i, chunk_size)
+        return type_da_from_chunk_records(etangle, parallel_map(type_da_chunk_records, [etangle] * len(chunks),
+                                                                chunks, workers=workers, pool=pool))
+
+    out = empty_type_da(etangle)
 
     strands = [ETangleStrands(etangle, left_strands, right_strands)
                for left_strands, right_strands in
-               enumerate_gens([etangle.left_points(), etangle.middle_points(), etangle.right_points()], i)]
+               iter_gens([etangle.left_points(), etangle.middle_points(), etangle.right_points()], i)]
 
     for x in strands:
-        out.add_generator(x.to_generator(out), (x.to_strand_diagram().maslov(), x.to_strand_diagram().twoalexander()))
+        out.add_generator(x.to_generator(out), x.grading)
 
     for x in strands:
         out.add_structure_map(x.to_generator(out), delta1_1(out, x))
@@ -74,6 +259,39 @@ def type_da_in_left_grading(etangle: ETangle, i: int) -> TypeDA:
     return out
 
 
+# the keys of the generators of type_da_in_left_grading(etangle, i), in lists of chunk_size
+def generator_key_chunks(etangle: ETangle, i: int, chunk_size: int) -> List[List[int]]:
+    keys = [ETangleStrands(etangle, left_strands, right_strands).key()
+            for left_strands, right_strands in
+            iter_gens([etangle.left_points(), etangle.middle_points(), etangle.right_points()], i)]
+    return [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+
+
+# the generators with the given keys and the edges delta1_1 and delta1_2 give out of them, as
+# (generator records, edge records) (see Module.to_records), to send between processes
+def type_da_chunk_records(etangle: ETangle, keys: List[int]):
+    module = empty_type_da(etangle)
+    nodes = []
+    edges = []
+    for key in keys:
+        x = ETangleStrands.from_key(etangle, key)
+        nodes += [(key, tuple(sorted(x.left_idempotent().strands.keys())),
+                   tuple(sorted(x.right_idempotent().strands.keys())), x.grading)]
+        edges += module.structure_map_records(x.to_generator(module), delta1_1(module, x))
+
+        for a in etangle.right_algebra.left_gens(list(x.right_strands.values())):
+            edges += module.structure_map_records(x.to_generator(module) ** a, delta1_2(module, x, a))
+    return nodes, edges
+
+
+# type_da_in_left_grading(etangle, i), put back together from type_da_chunk_records() of all its generators
+def type_da_from_chunk_records(etangle: ETangle, results: List) -> TypeDA:
+    out = empty_type_da(etangle)
+    return out.add_records((out.ring.variable_list,
+                            [node for nodes, _ in results for node in nodes],
+                            [edge for _, edges in results for edge in edges]))
+
+
 def delta1_1(module: TypeDA, x: ETangleStrands) -> Module.TensorElement:
     return x.left_idempotent().to_element() ** (d_plus(module, x) + d_minus(module, x) + d_mixed(module, x)) \
            + delta_ell(module, x)
@@ -84,18 +302,18 @@ def delta1_2(module: TypeDA, x: ETangleStrands, a: AMinus.Generator) -> Module.T
 
 
 def d_plus(module: Module, x: ETangleStrands) -> Module.TensorElement:
-    out = module.zero()
+    out = module.accumulator()
     for black1, black2 in itertools.combinations(x.right_strands.keys(), 2):
         b1 = min(black1, black2)
         b2 = max(black1, black2)
         if x.right_y_pos(b1) > x.right_y_pos(b2):
             # smooth the crossing and add it to the output
             out += smooth_right_crossing(module, x, b1, b2)
-    return out
+    return out.freeze()
 
 
 def d_minus(module: Module, x: ETangleStrands) -> Module.TensorElement:
-    out = module.zero()
+    out = module.accumulator()
     for black1, black2 in itertools.combinations(x.left_strands.values(), 2):
         b1 = min(black1, black2)
         b2 = max(black1, black2)
@@ -103,11 +321,11 @@ def d_minus(module: Module, x: ETangleStrands) -> Module.TensorElement:
         if x.left_y_pos(b1) < x.left_y_pos(b2):
             # introduce a crossing and add it to the output
             out += introduce_left_crossing(module, x, b1, b2)
-    return out
+    return out.freeze()
 
 
 def d_mixed(module: Module, x: ETangleStrands) -> Module.TensorElement:
-    out = module.zero()
+    out = module.accumulator()
 
     for b1 in x.right_strands.keys():
         for b2 in x.right_strands.keys():
@@ -131,11 +349,11 @@ def d_mixed(module: Module, x: ETangleStrands) -> Module.TensorElement:
             if b1 < b2:
                 out += d_mixed_case_4(module, x, b1, b2)
 
-    return out
+    return out.freeze()
 
 
 def delta_ell(module: Module, x: ETangleStrands) -> Module.TensorElement:
-    out = module.zero()
+    out = module.accumulator()
     unoccupied = set(x.etangle.left_points()) - set(x.left_strands.keys())
 
     for a1 in unoccupied:
@@ -158,7 +376,12 @@ def delta_ell(module: Module, x: ETangleStrands) -> Module.TensorElement:
             if a1 < a2:
                 out += delta_ell_case_4(module, x, a1, a2)
 
-    return out
+    return out.freeze()
+
+
+# in the hat flavor every U is 0, so a term that picks up any power of one is dropped before it is built
+def vanishes_in_hat(etangle: ETangle, powers: Dict) -> bool:
+    return etangle.hat and any(powers.values())
 
 
 def m2(module: Module, x: ETangleStrands, a: AMinus.Generator) -> Module.TensorElement:
@@ -170,22 +393,14 @@ def m2(module: Module, x: ETangleStrands, a: AMinus.Generator) -> Module.TensorE
     if set(x.right_strands.values()) != set(a.strands.keys()):
         return module.zero()
 
-    orange_strands = {}
-    orange_signs = {}
-    for orange in range(1, len(x.etangle.signs)):
-        if x.etangle.right_y_pos(orange):
-            orange_strands[orange] = (
-                x.etangle.middle_y_pos(orange), x.etangle.right_y_pos(orange), x.etangle.right_y_pos(orange)
-            )
-        orange_signs[orange] = x.etangle.signs[orange]
     black_strands = {}
     for black in x.right_strands.keys():
         black_strands[black] = (black, x.right_strands[black], a.strands[x.right_strands[black]])
 
     c = x.etangle.ring.one()
-    sd = StrandDiagram(orange_strands, orange_signs, black_strands)
+    sd = StrandDiagram(x.etangle.right_orange_strands, x.etangle.orange_signs, black_strands)
     powers = sd.figure_6_relations()
-    if powers is None:
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         for _ in range(power):
@@ -196,7 +411,6 @@ def m2(module: Module, x: ETangleStrands, a: AMinus.Generator) -> Module.TensorE
     return c * x_out.to_generator(module)
 
 
-@multimethod
 def smooth_right_crossing(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     a1 = x.right_y_pos(b1)
     a2 = x.right_y_pos(b2)
@@ -204,15 +418,16 @@ def smooth_right_crossing(module: Module, x: ETangleStrands, b1: int, b2: int) -
     crossing_range_1 = range(a1, b1+1) if a1 < b1 else range(b1, a1+1)
     crossing_range_2 = range(a2, b2+1) if a2 < b2 else range(b2, a2+1)
     possible_crossings = list(set(crossing_range_1) & set(crossing_range_2))
-    sd = smooth_right_crossing(x, b1, b2, possible_crossings[0])
-    for crossing in possible_crossings[1:]:
-        new_sd = smooth_right_crossing(x, b1, b2, crossing)
-        if new_sd.num_orange_black_crossings() < sd.num_orange_black_crossings():
-            sd = new_sd
+    # take the crossing with the fewest orange-black crossings; only b1 and b2 move with it, so only count theirs
+    oranges = x.etangle.right_orange_strands.values()
+    crossing = min(possible_crossings,
+                   key=lambda crossing: StrandDiagram.num_crossings(oranges, (b1, crossing + .1, a2))
+                   + StrandDiagram.num_crossings(oranges, (b2, crossing + .2, a1)))
+    sd = smooth_right_crossing_diagram(x, b1, b2, crossing)
 
     c = x.etangle.ring.one()
     powers = sd.figure_6_relations()
-    if powers is None:
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -222,19 +437,11 @@ def smooth_right_crossing(module: Module, x: ETangleStrands, b1: int, b2: int) -
     return c * x_out.to_generator(module)
 
 
-@multimethod
-def smooth_right_crossing(x: ETangleStrands, b1: int, b2: int, crossing: int) -> StrandDiagram:
+# the strand diagram obtained by smoothing the crossing between b1 and b2 at the given height
+def smooth_right_crossing_diagram(x: ETangleStrands, b1: int, b2: int, crossing: int) -> StrandDiagram:
     a1 = x.right_y_pos(b1)
     a2 = x.right_y_pos(b2)
 
-    orange_strands = {}
-    orange_signs = {}
-    for orange in range(1, len(x.etangle.signs)):
-        if x.etangle.right_y_pos(orange):
-            orange_strands[orange] = (
-                x.etangle.middle_y_pos(orange), x.etangle.right_y_pos(orange), x.etangle.right_y_pos(orange)
-            )
-        orange_signs[orange] = x.etangle.signs[orange]
     black_strands = {}
     for black in x.right_strands.keys():
         if black == b1:
@@ -244,10 +451,9 @@ def smooth_right_crossing(x: ETangleStrands, b1: int, b2: int, crossing: int) ->
         else:
             black_strands[black] = (black, x.right_y_pos(black), x.right_y_pos(black))
 
-    return StrandDiagram(orange_strands, orange_signs, black_strands)
+    return StrandDiagram(x.etangle.right_orange_strands, x.etangle.orange_signs, black_strands)
 
 
-@multimethod
 def introduce_left_crossing(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     a1 = x.left_y_pos(b1)
     a2 = x.left_y_pos(b2)
@@ -255,15 +461,16 @@ def introduce_left_crossing(module: Module, x: ETangleStrands, b1: int, b2: int)
     crossing_range_1 = range(a1, b2+1) if a1 < b2 else range(b2, a1+1)
     crossing_range_2 = range(a2, b1+1) if a2 < b1 else range(b1, a2+1)
     possible_crossings = list(set(crossing_range_1) & set(crossing_range_2))
-    sd = introduce_left_crossing(x, b1, b2, possible_crossings[0])
-    for crossing in possible_crossings[1:]:
-        new_sd = introduce_left_crossing(x, b1, b2, crossing)
-        if new_sd.num_orange_black_crossings() < sd.num_orange_black_crossings():
-            sd = new_sd
+    # take the crossing with the fewest orange-black crossings; only b1 and b2 move with it, so only count theirs
+    oranges = x.etangle.left_orange_strands.values()
+    crossing = min(possible_crossings,
+                   key=lambda crossing: StrandDiagram.num_crossings(oranges, (a1, crossing + .1, b1))
+                   + StrandDiagram.num_crossings(oranges, (a2, crossing + .2, b2)))
+    sd = introduce_left_crossing_diagram(x, b1, b2, crossing)
 
     c = x.etangle.ring.one()
     powers = sd.figure_7_relations()
-    if powers is None:
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -273,20 +480,11 @@ def introduce_left_crossing(module: Module, x: ETangleStrands, b1: int, b2: int)
     return c * x_out.to_generator(module)
 
 
-@multimethod
-def introduce_left_crossing(x: ETangleStrands, b1: int, b2: int, crossing: int) -> StrandDiagram:
+# the strand diagram obtained by introducing a crossing between b1 and b2 at the given height
+def introduce_left_crossing_diagram(x: ETangleStrands, b1: int, b2: int, crossing: int) -> StrandDiagram:
     a1 = x.left_y_pos(b1)
     a2 = x.left_y_pos(b2)
 
-    orange_strands = {}
-    orange_signs = {}
-    for orange in range(1, len(x.etangle.signs)):
-        if x.etangle.left_y_pos(orange):
-            # (left, middle, middle) breaks {0: 0, 1: 2} on a cup with (-1, 1)
-            orange_strands[orange] = (
-                x.etangle.left_y_pos(orange), x.etangle.left_y_pos(orange), x.etangle.middle_y_pos(orange)
-            )
-        orange_signs[orange] = x.etangle.signs[orange]
     black_strands = {}
     for black in x.left_strands.values():
         if black == b1:
@@ -296,13 +494,13 @@ def introduce_left_crossing(x: ETangleStrands, b1: int, b2: int, crossing: int)
         else:
             black_strands[black] = (x.left_y_pos(black), x.left_y_pos(black), black)
 
-    return StrandDiagram(orange_strands, orange_signs, black_strands)
+    return StrandDiagram(x.etangle.left_orange_strands, x.etangle.orange_signs, black_strands)
 
 
 def d_mixed_case_1(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     c = x.etangle.ring.one()
-    powers = x.to_strand_diagram().figure_8_case_1b(b1, b2)
-    if powers is None:
+    powers = x.strand_diagram.figure_8_case_1b(b1, b2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -312,8 +510,8 @@ def d_mixed_case_1(module: Module, x: ETangleStrands, b1: int, b2: int) -> Modul
 
 def d_mixed_case_2(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     c = x.etangle.ring.one()
-    powers = x.to_strand_diagram().figure_8_case_2b(b1, b2)
-    if powers is None:
+    powers = x.strand_diagram.figure_8_case_2b(b1, b2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -325,8 +523,8 @@ def d_mixed_case_2(module: Module, x: ETangleStrands, b1: int, b2: int) -> Modul
 
 def d_mixed_case_3(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     c = x.etangle.ring.one()
-    powers = x.to_strand_diagram().figure_8_case_3b(b1, b2)
-    if powers is None:
+    powers = x.strand_diagram.figure_8_case_3b(b1, b2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -343,8 +541,8 @@ def d_mixed_case_3(module: Module, x: ETangleStrands, b1: int, b2: int) -> Modul
 
 def d_mixed_case_4(module: Module, x: ETangleStrands, b1: int, b2: int) -> Module.TensorElement:
     c = x.etangle.ring.one()
-    powers = x.to_strand_diagram().figure_8_case_4b(b1, b2)
-    if powers is None:
+    powers = x.strand_diagram.figure_8_case_4b(b1, b2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         c *= x.etangle.strand_index_to_variable(orange) ** power
@@ -362,8 +560,8 @@ def d_mixed_case_4(module: Module, x: ETangleStrands, b1: int, b2: int) -> Modul
 def delta_ell_case_1(module: Module, x: ETangleStrands, a1: int, a2: int) -> Module.TensorElement:
     c1 = module.left_algebra.ring.one()
     c2 = module.ring.one()
-    powers = x.idempotent_and_left_strands().figure_8_case_1a(a1, a2)
-    if powers is None:
+    powers = x.left_strand_diagram.figure_8_case_1a(a1, a2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         if x.etangle.strand_index_to_left_sign(orange) == 1:
@@ -381,8 +579,8 @@ def delta_ell_case_1(module: Module, x: ETangleStrands, a1: int, a2: int) -> Mod
 def delta_ell_case_2(module: Module, x: ETangleStrands, a1: int, a2: int) -> Module.TensorElement:
     c1 = module.left_algebra.ring.one()
     c2 = x.etangle.ring.one()
-    powers = x.idempotent_and_left_strands().figure_8_case_2a(a1, a2)
-    if powers is None:
+    powers = x.left_strand_diagram.figure_8_case_2a(a1, a2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         if x.etangle.strand_index_to_left_sign(orange) == 1:
@@ -397,8 +595,8 @@ def delta_ell_case_2(module: Module, x: ETangleStrands, a1: int, a2: int) -> Mod
 def delta_ell_case_3(module: Module, x: ETangleStrands, a1: int, a2: int) -> Module.TensorElement:
     c1 = module.left_algebra.ring.one()
     c2 = x.etangle.ring.one()
-    powers = x.idempotent_and_left_strands().figure_8_case_3a(a1, a2)
-    if powers is None:
+    powers = x.left_strand_diagram.figure_8_case_3a(a1, a2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         if x.etangle.strand_index_to_left_sign(orange) == 1:
@@ -420,8 +618,8 @@ def delta_ell_case_3(module: Module, x: ETangleStrands, a1: int, a2: int) -> Mod
 def delta_ell_case_4(module: Module, x: ETangleStrands, a1: int, a2: int) -> Module.TensorElement:
     c1 = module.left_algebra.ring.one()
     c2 = x.etangle.ring.one()
-    powers = x.idempotent_and_left_strands().figure_8_case_4a(a1, a2)
-    if powers is None:
+    powers = x.left_strand_diagram.figure_8_case_4a(a1, a2)
+    if powers is None or vanishes_in_hat(x.etangle, powers):
         return module.zero()
     for orange, power in powers.items():
         if x.etangle.strand_index_to_left_sign(orange) == 1:
@@ -443,28 +641,44 @@ def delta_ell_case_4(module: Module, x: ETangleStrands, a1: int, a2: int) -> Mod
 # points - a list of sets of points
 # r - number of points occupied in the leftmost set
 def enumerate_gens(points, r=None):
-    sequences = []
+    return list(iter_gens(points, r))
+
+
+# yields the sequences enumerate_gens lists, one at a time: a partial bijection points[0] -> points[1] with r strands,
+# followed by injections from what is left of each set of points into the next that use up all of it
+def iter_gens(points, r=None) -> Iterator[List[Dict]]:
     if len(points) < 2:
-        return sequences
-    elif len(points) == 2:
-        return [[pb] for pb in partial_bijections(points[0], points[1], r)]
-    else:
-        for pb in partial_bijections(points[0], points[1], r):
-            coker = set(points[1]).difference(pb.values())
-            sequences.extend(
-                [[pb] + sequence for sequence in enumerate_gens_helper([list(coker)] + points[2:])])
-    return sequences
-
-
-def enumerate_gens_helper(points):
-    sequences = []
+        return
+    for pb in iter_partial_bijections(points[0], points[1], r):
+        yield from iter_gens_helper(pb, points[1:])
+
+
+# yields [first] + the sequences of injections starting from the points of points[0] that first misses
+def iter_gens_helper(first: Dict, points) -> Iterator[List[Dict]]:
     if len(points) < 2:
-        return sequences
-    elif len(points) == 2:
-        return [[inj] for inj in injections(points[0], points[1])]
-    else:
-        for inj in injections(points[0], points[1]):
-            coker = set(points[1]).difference(inj.values())
-            sequences.extend(
-                [[inj] + sequence for sequence in enumerate_gens_helper([list(coker)] + points[2:])])
-    return sequences
+        yield [first]
+        return
+    image = set(first.values())
+    coker = [point for point in points[0] if point not in image]
+    for inj in iter_injections(coker, points[1]):
+        for sequence in iter_gens_helper(inj, points[1:]):
+            yield [first] + sequence
+
+
+# the number of sequences enumerate_gens(points, r) lists, without listing them
+def count_gens(points, r=None) -> int:
+    if len(points) < 2:
+        return 0
+    if r is None:
+        return sum(count_gens(points, r) for r in range(len(points[0]) + 1))
+    if not 0 <= r <= min(len(points[0]), len(points[1])):
+        return 0
+    out = math.comb(len(points[0]), r) * math.perm(len(points[1]), r)
+    # the points of each set missed so far, which must all be sent into the next one
+    remaining = len(points[1]) - r
+    for next_points in points[2:]:
+        if remaining > len(next_points):
+            return 0
+        out *= math.perm(len(next_points), remaining)
+        remaining = len(next_points) - remaining
+    return out
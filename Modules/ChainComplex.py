@@ -1,20 +1,21 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Dict, Tuple
 
 from multimethod import multimethod
-from networkx import MultiDiGraph
 
+from Functions.Functions import gf2_rank
 from Modules.Module import Module
+from Modules.ModuleGraph import ModuleGraph
 from SignAlgebra.AMinus import AMinus
-from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
+from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
 
 
 class ChainComplex(Module):
 
     def __init__(self, ring: Z2PolynomialRing, left_algebra: AMinus, right_algebra: AMinus,
                  left_scalar_action: Z2PolynomialRing.Map, right_scalar_action: Z2PolynomialRing.Map,
-                 graph: MultiDiGraph = None):
+                 graph: ModuleGraph = None):
         super().__init__(ring, left_algebra, right_algebra, left_scalar_action, right_scalar_action, graph)
 
     @staticmethod
@@ -46,20 +47,92 @@ class ChainComplex(Module):
     def d(self, x: Module.TensorGenerator) -> Module.TensorElement:
         out = self.zero()
 
-        for _, y, (), d in self.graph.out_edges(x, keys=True, data=True):
-            out += d['c'] * y
+        for y, _, c in self.graph.out_edge_items(x):
+            out += c * y
 
         return out
 
     def d_squared_is_zero(self) -> bool:
-        for x in self.graph.nodes:
-            if self.d(self.d(x)) != self.zero():
-                print(x)
-                print(self.d(x))
-                print(self.d(self.d(x)))
+        generators, columns = self.sparse_matrix()
+        for j, column in enumerate(columns):
+            d_squared = {}
+            for i, c1 in column.items():
+                for k, c2 in columns[i].items():
+                    c = c1 * c2
+                    d_squared[k] = d_squared[k] + c if k in d_squared else c
+            if any(not c.is_zero() for c in d_squared.values()):
+                print(generators[j])
+                print({generators[k]: c for k, c in d_squared.items() if not c.is_zero()})
                 return False
         return True
 
+    # the differential as a sparse matrix over self.ring
+    # returns ([generators], [column]) where column j is {i: coefficient of generator i in d(generator j)}
+    def sparse_matrix(self) -> Tuple[List[Module.TensorGenerator], List[Dict[int, Z2Polynomial]]]:
+        generators = list(self.graph.nodes)
+        index = {x: i for i, x in enumerate(generators)}
+        columns = [{} for _ in generators]
+        for x, y, _, c in self.graph.edge_items():
+            column = columns[index[x]]
+            i = index[y]
+            column[i] = column[i] + c if i in column else c
+        for column in columns:
+            for i in [i for i, c in column.items() if c.is_zero()]:
+                del column[i]
+        return generators, columns
+
+    # the differential over Z/2 after setting every U variable to u (0 or 1)
+    # returns ([generators], [column]) where column j is a bitset of the generators appearing in d(generator j)
+    def gf2_matrix(self, u: int) -> Tuple[List[Module.TensorGenerator], List[int]]:
+        generators, columns = self.sparse_matrix()
+        return generators, [sum(1 << i for i, c in column.items() if ChainComplex.specialize(c, u))
+                            for column in columns]
+
+    # the value in Z/2 of the polynomial c after setting every variable to u (0 or 1)
+    @staticmethod
+    def specialize(c: Z2Polynomial, u: int) -> int:
+        if u == 0:
+            # only the constant term survives, and the constant monomial packs to 0
+            return 1 if 0 in c.terms else 0
+        elif u == 1:
+            return len(c.terms) % 2
+        raise Exception('U can only be set to 0 or 1')
+
+    # the ranks over Z/2 of the homology after setting every U variable to u (0 or 1)
+    # returns {grading: rank}; gradings are (maslov, twice alexander) for u = 0, and maslov mod 2 for u = 1,
+    # since setting U = 1 only preserves the Maslov grading mod 2
+    def homology_ranks(self, u: int = 0) -> Dict:
+        blocks = {}
+        for x, data in self.graph.nodes(data=True):
+            grading = data['grading'] if u == 0 else data['grading'][0] % 2
+            blocks.setdefault(grading, []).append(x)
+        index = {x: i for block in blocks.values() for i, x in enumerate(block)}
+
+        # the differential maps each grading to a single grading, so it splits into one block for each grading
+        out_ranks = {}
+        targets = {}
+        for grading, block in blocks.items():
+            vectors = []
+            for x in block:
+                v = 0
+                for y, _, c in self.graph.out_edge_items(x):
+                    if ChainComplex.specialize(c, u):
+                        y_grading = self.graph.nodes[y]['grading'] if u == 0 else self.graph.nodes[y]['grading'][0] % 2
+                        if targets.setdefault(grading, y_grading) != y_grading:
+                            raise Exception('non-homogeneous differential')
+                        v ^= 1 << index[y]
+                vectors.append(v)
+            out_ranks[grading] = gf2_rank(vectors)
+
+        ranks = {grading: len(block) - out_ranks[grading] for grading, block in blocks.items()}
+        for grading, target in targets.items():
+            ranks[target] -= out_ranks[grading]
+        return {grading: rank for grading, rank in ranks.items() if rank != 0}
+
+    # the total rank over Z/2 of the homology after setting every U variable to u (0 or 1)
+    def homology_rank(self, u: int = 0) -> int:
+        return sum(self.homology_ranks(u).values())
+
     def m2_def(self) -> List[str]:
         arrows_per_def = 50
 
@@ -70,9 +143,9 @@ class ChainComplex(Module):
             for j, y in enumerate(gens):
                 if x == y:
                     continue
-                if y in self.graph[x]:
-                    k, d = list(self.graph[x][y].items())[0]
-                    c = d['c']
+                edges = self.graph.edges_between(x, y)
+                if edges:
+                    c = list(edges.values())[0]
                     arrow_strings += [f"({j},{i}) => {c}"]
 
         out = [f"R = ZZ/2[{','.join(self.ring.variables)}]"]
@@ -96,17 +169,21 @@ class ChainComplex(Module):
                and c == c.ring.one()
 
     def reduce_edge(self, x, y, k, d) -> None:
-        in_edges = list(self.graph.in_edges(y, keys=True, data=True))
-        out_edges = list(self.graph.out_edges(x, keys=True, data=True))
+        in_edges = self.graph.in_edge_items(y)
+        out_edges = self.graph.out_edge_items(x)
 
         self.graph.remove_nodes_from([x, y])
 
-        for w, _, (), d_wy in in_edges:
+        # {w: the sum of the zigzags starting at it}
+        outputs = {}
+        for w, _, c_wy in in_edges:
             if w == x or w == y:
                 continue
-            c_wy = d_wy['c']
-            for _, z, (), d_xz in out_edges:
+            for z, _, c_xz in out_edges:
                 if z == x or z == y:
                     continue
-                c_xz = d_xz['c']
-                self.add_structure_map(w, c_wy * c_xz * z)
+                if w not in outputs:
+                    outputs[w] = self.accumulator()
+                outputs[w] += c_wy * c_xz * z
+        for w, output in outputs.items():
+            self.add_structure_map(w, output.freeze())
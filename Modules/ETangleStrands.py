@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Dict
+from functools import cached_property
+from typing import Dict, Tuple
 from frozendict import frozendict
 
 from Functions.Functions import invert_injection, dict_to_sorted_string
@@ -18,10 +19,48 @@ class ETangleStrands:
         self.left_strands_inverse = frozendict(invert_injection(left_strands))
         self.right_strands = frozendict(right_strands)
         self.right_strands_inverse = frozendict(invert_injection(right_strands))
+        # the last generator made by to_generator()
+        self._generator = None
 
     def to_generator(self, module):
         from Modules.Module import Module
-        return Module.TensorGenerator(module, str(self), self.left_idempotent(), self.right_idempotent())
+        if self._generator is None or self._generator.module is not module:
+            self._generator = Module.TensorGenerator(module, self.key(), self.left_idempotent(),
+                                                     self.right_idempotent())
+        return self._generator
+
+    # a small integer determining these strands on this etangle, used as the generator key
+    # reading the left points, then the middle points, in order, each one contributes a digit:
+    # 0 if no strand starts there, or 1 + the index of the point its strand ends at
+    def key(self) -> int:
+        middle_points = self.etangle.middle_points()
+        right_points = self.etangle.right_points()
+        middle_index = {point: i + 1 for i, point in enumerate(middle_points)}
+        right_index = {point: i + 1 for i, point in enumerate(right_points)}
+        out = 0
+        for point in self.etangle.left_points():
+            out = out * (len(middle_points) + 1) + middle_index.get(self.left_strands.get(point), 0)
+        for point in middle_points:
+            out = out * (len(right_points) + 1) + right_index.get(self.right_strands.get(point), 0)
+        return out
+
+    # the inverse of key(): the strands on etangle with the given key
+    @staticmethod
+    def from_key(etangle: ETangle, key: int) -> ETangleStrands:
+        middle_points = etangle.middle_points()
+        right_points = etangle.right_points()
+        right_strands = {}
+        for point in reversed(middle_points):
+            key, digit = divmod(key, len(right_points) + 1)
+            if digit:
+                right_strands[point] = right_points[digit - 1]
+        left_strands = {}
+        for point in reversed(etangle.left_points()):
+            key, digit = divmod(key, len(middle_points) + 1)
+            if digit:
+                left_strands[point] = middle_points[digit - 1]
+        assert key == 0
+        return ETangleStrands(etangle, left_strands, right_strands)
 
     # the idempotent e^D_L                                                                                                                                
     def left_idempotent(self) -> AMinus.Generator:
@@ -42,38 +81,38 @@ class ETangleStrands:
     def right_y_pos(self, black_strand: int):
         return self.right_strands[black_strand]
 
+    # to_strand_diagram(), idempotent_and_left_strands() and the grading, computed once and then kept
+    # the diagrams are shared, so they must not be modified
+    @cached_property
+    def strand_diagram(self) -> StrandDiagram:
+        return self.to_strand_diagram()
+
+    @cached_property
+    def left_strand_diagram(self) -> StrandDiagram:
+        return self.idempotent_and_left_strands()
+
+    # (maslov, twoalexander)
+    @cached_property
+    def grading(self) -> Tuple[int, int]:
+        return self.strand_diagram.maslov(), self.strand_diagram.twoalexander()
+
     def to_strand_diagram(self):
-        orange_strands = {}
-        orange_signs = {}
-        for orange in range(1, len(self.etangle.signs)):
-            orange_strands[orange] = (
-                self.etangle.left_y_pos(orange), self.etangle.middle_y_pos(orange), self.etangle.right_y_pos(orange)
-            )
-            orange_signs[orange] = self.etangle.signs[orange]
         black_strands = {}
         for black in self.left_strands.values():
             black_strands[black] = (self.left_y_pos(black), black, None)
         for black in self.right_strands.keys():
             black_strands[black] = (None, black, self.right_y_pos(black))
 
-        return StrandDiagram(orange_strands, orange_signs, black_strands)
+        return StrandDiagram(self.etangle.orange_strands, self.etangle.orange_signs, black_strands)
 
     def idempotent_and_left_strands(self):
-        orange_strands = {}
-        orange_signs = {}
-        for orange in range(1, len(self.etangle.signs)):
-            if self.etangle.left_y_pos(orange):
-                orange_strands[orange] = (
-                    self.etangle.left_y_pos(orange), self.etangle.left_y_pos(orange), self.etangle.middle_y_pos(orange)
-                )
-                orange_signs[orange] = self.etangle.signs[orange]
         black_strands = {}
         for black in self.etangle.left_points():
             if black in self.left_strands.keys():
                 black_strands[black] = (None, black, self.left_strands[black])
             else:
                 black_strands[black] = (black, black, None)
-        return StrandDiagram(orange_strands, orange_signs, black_strands)
+        return StrandDiagram(self.etangle.left_orange_strands, self.etangle.orange_signs, black_strands)
 
     def __str__(self):
         return dict_to_sorted_string(self.left_strands) + dict_to_sorted_string(self.right_strands)
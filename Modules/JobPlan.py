@@ -0,0 +1,181 @@
+from __future__ import annotations
+import functools
+import itertools
+import math
+import time
+from typing import Dict, List, Optional
+
+from Modules.CTMinus import count_gens, idempotent_counts, multiply_idempotent_counts, piece_left_occupied_points, \
+    type_da_in_left_grading, empty_type_da, tensor_order_costs
+from Modules.TypeDACache import TypeDACache
+from Tangles.Tangle import Tangle, ETangle
+
+
+# rough predictions of how long a job will take and how much memory it will need, made without running it
+# generator counts of type_da are exact; everything else is an estimate scaled by a Calibration
+
+
+# the costs of the basic steps, in seconds and bytes
+# the defaults were measured on one core of a development machine; Calibration.measure() rescales the times for the
+# machine it runs on
+class Calibration:
+    def __init__(self, seconds_per_m2_call: float = 6e-5, seconds_per_edge: float = 2.7e-4,
+                 seconds_per_pair: float = 0.3, bytes_per_generator: int = 500, bytes_per_edge: int = 850,
+                 edge_density: float = 1.0, edges_per_product_generator: float = 600):
+        # building a type DA structure: every (generator, algebra generator) pair goes through m2, and every edge
+        # costs the rest of delta1_1 and delta1_2
+        self.seconds_per_m2_call = seconds_per_m2_call
+        self.seconds_per_edge = seconds_per_edge
+        # tensoring reduced structures: every pair of generators tensored together, with all the edges that follow
+        self.seconds_per_pair = seconds_per_pair
+        self.bytes_per_generator = bytes_per_generator
+        self.bytes_per_edge = bytes_per_edge
+        # a generator of type_da(etangle) has about edge_density * len(middle points) ** 2 / 2 edges
+        self.edge_density = edge_density
+        # a generator of a reduced tensor product has about this many edges
+        self.edges_per_product_generator = edges_per_product_generator
+
+    # the default calibration, with its times scaled by how long type_da_in_left_grading(etangle, r) actually takes
+    # here compared to its estimate
+    @staticmethod
+    def measure(etangle: Optional[ETangle] = None, r: int = 2) -> Calibration:
+        if etangle is None:
+            etangle = ETangle(ETangle.Type.OVER, (-1, 1, -1), 2)
+        out = Calibration()
+        start = time.perf_counter()
+        type_da_in_left_grading(etangle, r)
+        scale = (time.perf_counter() - start) / estimate_type_da_in_left_grading(etangle, r, out).seconds
+        out.seconds_per_m2_call *= scale
+        out.seconds_per_edge *= scale
+        out.seconds_per_pair *= scale
+        return out
+
+    def __repr__(self) -> str:
+        return str(self.__dict__)
+
+
+# the predicted size of a job's result and what the job costs
+class JobEstimate:
+    def __init__(self, generators: int = 0, edges: int = 0, seconds: float = 0, bytes: int = 0):
+        self.generators = generators
+        self.edges = edges
+        self.seconds = seconds
+        # peak memory
+        self.bytes = bytes
+
+    # two jobs run one after the other, keeping both results
+    def __add__(self, other: JobEstimate) -> JobEstimate:
+        return JobEstimate(self.generators + other.generators, self.edges + other.edges,
+                           self.seconds + other.seconds, self.bytes + other.bytes)
+
+    # whether this job is expected to finish within the given limits
+    def fits(self, max_seconds: Optional[float] = None, max_bytes: Optional[int] = None) -> bool:
+        return (max_seconds is None or self.seconds <= max_seconds) and (max_bytes is None or self.bytes <= max_bytes)
+
+    def __repr__(self) -> str:
+        return f"{self.generators} generators, ~{self.edges} edges, ~{self.seconds:.3g}s, ~{self.bytes / 2**20:.3g}MB"
+
+
+# {r: the number of generators of type_da(etangle) with r occupied points on the left}
+def generator_counts(etangle: ETangle) -> Dict[int, int]:
+    points = [etangle.left_points(), etangle.middle_points(), etangle.right_points()]
+    return {r: count_gens(points, r) for r in range(len(points[0]) + 1)}
+
+
+# the idempotent_counts() of type_da_in_left_grading(etangle, r), without building it
+# a generator occupies r points on the left and the other len(middle points) - r on the right, and for every choice
+# of those points there are len(middle points)! ways to connect them through the middle
+def type_da_idempotent_counts(etangle: ETangle, r: int) -> Dict:
+    return idempotent_counts_with(etangle, r, math.factorial(len(etangle.middle_points())))
+
+
+# an estimate of the idempotent_counts() of reduced_type_da_in_left_grading(etangle, r), without building it
+# reducing has so far always left either nothing or 2 ** (len(middle points) - 1) generators with each pair of
+# idempotents; taking every pair to be of the second kind gives an upper bound
+def reduced_type_da_idempotent_counts(etangle: ETangle, r: int) -> Dict:
+    return idempotent_counts_with(etangle, r, 2 ** (len(etangle.middle_points()) - 1))
+
+
+# {left idempotent points: {right idempotent points: count}} over every pair of idempotents a generator of
+# type_da_in_left_grading(etangle, r) can have
+def idempotent_counts_with(etangle: ETangle, r: int, count: int) -> Dict:
+    right_occupied = len(etangle.middle_points()) - r
+    if right_occupied < 0:
+        return {}
+    row = {right: count for right in itertools.combinations(etangle.right_points(), right_occupied)}
+    if not row:
+        return {}
+    left = range(len(etangle.left_algebra.ss))
+    return {tuple(point for point in left if point not in occupied): dict(row)
+            for occupied in itertools.combinations(etangle.left_points(), r)}
+
+
+def estimate_type_da_in_left_grading(etangle: ETangle, r: int, calibration: Calibration = None) -> JobEstimate:
+    if calibration is None:
+        calibration = Calibration()
+    middle = len(etangle.middle_points())
+    generators = count_gens([etangle.left_points(), etangle.middle_points(), etangle.right_points()], r)
+    if generators == 0:
+        return JobEstimate()
+    # delta1_2 tries every algebra generator starting from the occupied points on the right
+    m2_calls = generators * math.perm(len(etangle.right_algebra.ss), middle - r)
+    edges = round(generators * calibration.edge_density * middle * middle / 2)
+    return JobEstimate(generators, edges,
+                       m2_calls * calibration.seconds_per_m2_call + edges * calibration.seconds_per_edge,
+                       generators * calibration.bytes_per_generator + edges * calibration.bytes_per_edge)
+
+
+# what type_da(etangle) costs, computing the left gradings one after the other
+def estimate_type_da(etangle: ETangle, calibration: Calibration = None) -> JobEstimate:
+    return sum((estimate_type_da_in_left_grading(etangle, r, calibration)
+                for r in range(len(etangle.left_points()) + 1)), JobEstimate())
+
+
+# what reduced_type_da_in_right_grading(tangle, i, cache) costs with order='fold'
+# pieces found in the cache cost nothing to build and are taken at their actual size; the others are taken at the
+# size reduced_type_da_idempotent_counts() gives, and the products are assumed not to shrink when reduced, so the
+# tensor part of the estimate is an upper bound
+def estimate_reduced_type_da_in_right_grading(tangle: Tangle, i: int, calibration: Calibration = None,
+                                              cache: Optional[TypeDACache] = None) -> JobEstimate:
+    if calibration is None:
+        calibration = Calibration()
+    out = JobEstimate()
+    missing = []
+    counts = piece_idempotent_counts(tangle, i, cache, missing)
+    for etangle, r in missing:
+        # the unreduced piece is only held until it is reduced
+        piece = estimate_type_da_in_left_grading(etangle, r, calibration)
+        out.seconds += piece.seconds
+        out.bytes = max(out.bytes, piece.bytes)
+
+    out.seconds += tensor_order_costs(counts)['fold'] * calibration.seconds_per_pair
+    product = functools.reduce(multiply_idempotent_counts, counts)
+    out.generators = sum(sum(row.values()) for row in product.values())
+    out.edges = round(out.generators * calibration.edges_per_product_generator)
+    out.bytes = max(out.bytes, out.generators * calibration.bytes_per_generator
+                    + out.edges * calibration.bytes_per_edge)
+    return out
+
+
+# the idempotent_counts() of the reduced pieces reduced_type_da_in_right_grading(tangle, i, cache) tensors together:
+# exact for the pieces found in the cache, reduced_type_da_idempotent_counts() for the others
+# missing - if given, the (etangle, r) of every piece not found in the cache is appended to it
+def piece_idempotent_counts(tangle: Tangle, i: int, cache: Optional[TypeDACache] = None,
+                            missing: Optional[List] = None) -> List[Dict]:
+    out = []
+    for etangle, r in zip(tangle.etangles, piece_left_occupied_points(tangle, i)):
+        records = cache.get(etangle, r, True) if cache is not None else None
+        if records is not None:
+            out += [idempotent_counts(empty_type_da(etangle).add_records(records))]
+        else:
+            if missing is not None:
+                missing += [(etangle, r)]
+            out += [reduced_type_da_idempotent_counts(etangle, r)]
+    return out
+
+
+# what reduced_type_da(tangle, cache=cache) costs, computing the right gradings one after the other
+def estimate_reduced_type_da(tangle: Tangle, calibration: Calibration = None,
+                             cache: Optional[TypeDACache] = None) -> JobEstimate:
+    return sum((estimate_reduced_type_da_in_right_grading(tangle, i, calibration, cache)
+                for i in range(len(tangle.right_points()) + 1)), JobEstimate())
@@ -1,14 +1,19 @@
 from __future__ import annotations
+import itertools
+import time
+import weakref
+from functools import partial
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import Optional, List, Dict, Callable
 
 import networkx as nx
 from frozendict import frozendict
-from multimethod import multimethod
+from heapdict import heapdict
 from networkx import DiGraph, MultiDiGraph
 from pygraphviz import AGraph
 
-from Functions.Functions import simplify_coefficients
+from Functions.Functions import simplify_coefficients, Accumulator
+from Modules.ModuleGraph import ModuleGraph
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.TensorAlgebra import TensorAlgebra
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
@@ -19,13 +24,18 @@ class Module(ABC):
     def __init__(self, ring: Z2PolynomialRing, left_algebra: Optional[AMinus], right_algebra: Optional[AMinus],
                  left_scalar_action: Optional[Z2PolynomialRing.Map],
                  right_scalar_action: Optional[Z2PolynomialRing.Map],
-                 graph: MultiDiGraph = None):
+                 graph: ModuleGraph = None):
         self.ring = ring
         self.left_algebra = left_algebra
         self.right_algebra = right_algebra
         self.left_scalar_action = left_scalar_action
         self.right_scalar_action = right_scalar_action
-        self.graph = graph or MultiDiGraph()
+        if isinstance(graph, MultiDiGraph):
+            graph = ModuleGraph.from_networkx(graph)
+        self.graph = graph if graph is not None else ModuleGraph()
+        # {(key, left idempotent, right idempotent): TensorGenerator}, see TensorGenerator.__new__
+        # the references are weak, so generators dropped from the graph are not kept alive by the table
+        self.generator_table = weakref.WeakValueDictionary()
         if left_scalar_action is not None:
             self.left_tensor_algebra = TensorAlgebra(left_algebra)
             assert left_algebra.ring == left_scalar_action.source, "left scalar action has wrong source"
@@ -44,6 +54,16 @@ class Module(ABC):
             y = gen_out.get_module_generator()
             self.add_edge(x, y, (gen_out.left, input.right), c_out)
 
+    # the edges add_structure_map(input, output) would add, as edge records (see to_records)
+    def structure_map_records(self, input: Module.TensorGenerator, output: Module.TensorElement) -> List:
+        assert self.valid_input_gen(input)
+        out = []
+        for gen_out, c_out in output.coefficients.items():
+            assert self.valid_output_gen(gen_out)
+            out += [(input.key, gen_out.key, Module.factors_to_record(gen_out.left),
+                     Module.factors_to_record(input.right), tuple(sorted(c_out.terms)))]
+        return out
+
     @staticmethod
     def valid_input_gen(g):
         pass
@@ -55,43 +75,164 @@ class Module(ABC):
     def __repr__(self) -> str:
         return str(self.__dict__)
 
+    # the generator table cannot be pickled; the unpickled generators fill in a new one, see TensorGenerator.unpickle
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['generator_table']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'generator_table' not in self.__dict__:
+            self.generator_table = weakref.WeakValueDictionary()
+
     # add the given generator to this module
     def add_generator(self, generator: Module.TensorGenerator, grading: (int, int)) -> None:
         self.graph.add_node(generator, grading=grading)
 
+    # adds c to the coefficient of the edge x -> y with key k
+    # zero coefficients are dropped here; over a hat ring this is every coefficient with a U in it
     def add_edge(self, x, y, k, c):
-        current = self.graph.get_edge_data(x, y, key=k)
-        if current is None:
-            self.graph.add_edge(x, y, key=k, c=self.ring.zero())
-            current = self.graph.get_edge_data(x, y, key=k)
-        current['c'] += c
-        if current['c'] == self.ring.zero():
-            self.graph.remove_edge(x, y, key=k)
-
-    def reduce(self) -> Module:
+        if not c.is_zero():
+            self.graph.add_coefficient(x, y, k, c)
+
+    # see reduce_component() for the meaning of strategy and stats
+    def reduce(self, strategy: str = 'fifo', stats: ReductionStats = None) -> Module:
         components = self.decomposed()
         if len(components) == 0:
             return self
+        if stats is not None:
+            stats.start(self.graph.number_of_edges())
         for component in components:
-            component.reduce_component()
+            component.reduce_component(strategy, stats)
+        if stats is not None:
+            stats.finish()
         return self.direct_sum(components)
 
-    def reduce_component(self) -> Module:
-        reducible_edge = self.get_reducible_edge()
-        while reducible_edge is not None:
+    # cancels reducible edges until there are none left
+    # keeps a worklist of pairs (x, y) that might be joined by a reducible edge; cancelling x -> y only changes
+    # the edges w -> z for w an in-neighbour of y and z an out-neighbour of x, so only those pairs are rechecked
+    # strategy - the order in which reducible edges are cancelled, one of REDUCTION_STRATEGIES:
+    #   'fifo' - in the order they are found
+    #   'degree' - the edge creating the fewest zigzags first, i.e. the smallest in-degree(y) * out-degree(x)
+    #   'grading' - by the grading of the source generator, lowest first
+    # stats - if given, records the number of cancellations, the peak edge count and the time taken
+    def reduce_component(self, strategy: str = 'fifo', stats: ReductionStats = None) -> Module:
+        assert strategy in REDUCTION_STRATEGIES, f"unknown reduction strategy {strategy}"
+        standalone = stats is not None and stats.start_time is None
+        if standalone:
+            stats.start(self.graph.number_of_edges())
+
+        counter = itertools.count()
+        priority = {
+            'fifo': lambda x, y: next(counter),
+            'degree': lambda x, y: (self.graph.in_degree(y) * self.graph.out_degree(x), next(counter)),
+            'grading': lambda x, y: (self.graph.nodes[x]['grading'], next(counter)),
+        }[strategy]
+
+        worklist = heapdict()
+        for x, y in self.graph.edges():
+            if (x, y) not in worklist and self.reducible_edge_between(x, y) is not None:
+                worklist[(x, y)] = priority(x, y)
+        while worklist:
+            (x, y), _ = worklist.popitem()
+            if x not in self.graph or y not in self.graph:
+                continue
+            reducible_edge = self.reducible_edge_between(x, y)
+            if reducible_edge is None:
+                continue
+            sources = [w for w in self.graph.predecessors(y) if w != x and w != y]
+            targets = [z for z in self.graph.successors(x) if z != x and z != y]
+            if strategy == 'degree':
+                # the nodes whose out-degree or in-degree the cancellation can change
+                out_changed = set(sources) | set(self.graph.predecessors(x))
+                in_changed = set(targets) | set(self.graph.successors(y))
+            if stats is not None:
+                edges_before = self.count_edges_near(x, y, sources, targets)
             self.reduce_edge(*reducible_edge)
-            reducible_edge = self.get_reducible_edge()
+            if stats is not None:
+                stats.cancelled(self.count_edges_near(x, y, sources, targets) - edges_before)
+            for w in sources:
+                for z in targets:
+                    if self.reducible_edge_between(w, z) is not None:
+                        worklist[(w, z)] = priority(w, z)
+                    elif (w, z) in worklist:
+                        del worklist[(w, z)]
+            if strategy == 'degree':
+                # every waiting pair with an end whose degree changed gets its priority recomputed, so that the
+                # lowest degree pair really is the next one out
+                for w in out_changed - {x, y}:
+                    for z in self.graph.successors(w):
+                        if (w, z) in worklist:
+                            worklist[(w, z)] = priority(w, z)
+                for z in in_changed - {x, y}:
+                    for w in self.graph.predecessors(z):
+                        if (w, z) in worklist:
+                            worklist[(w, z)] = priority(w, z)
+
+        if standalone:
+            stats.finish()
         return self
 
+    # cancels the reducible edges among the pairs (x, y) in worklist, in order, emptying it
+    # the pairs (w, z) a cancellation touches are added back to the worklist when both w and z are in allowed
+    # returns the number of cancellations
+    def cancel_reducible_edges(self, worklist: Dict, allowed) -> int:
+        out = 0
+        while worklist:
+            x, y = next(iter(worklist))
+            del worklist[(x, y)]
+            reducible_edge = self.reducible_edge_between(x, y)
+            if reducible_edge is None:
+                continue
+            sources = [w for w in self.graph.predecessors(y) if w != x and w != y and w in allowed]
+            targets = [z for z in self.graph.successors(x) if z != x and z != y and z in allowed]
+            self.reduce_edge(*reducible_edge)
+            out += 1
+            for w in sources:
+                for z in targets:
+                    worklist[(w, z)] = None
+        return out
+
+    # the number of edges touching x or y, plus the number of edges from sources to targets
+    def count_edges_near(self, x, y, sources, targets) -> int:
+        out = 0
+        if x in self.graph:
+            edges = set()
+            for v in (x, y):
+                edges |= {(v, z, k) for z, k, _ in self.graph.out_edge_items(v)}
+                edges |= {(w, v, k) for w, k, _ in self.graph.in_edge_items(v)}
+            out += len(edges)
+        for w in sources:
+            for z in targets:
+                out += self.graph.number_of_edges(w, z)
+        return out
+
+    # reduces a copy of this module with each strategy, returning {strategy: ReductionStats}
+    def compare_reduction_strategies(self, strategies=None) -> Dict[str, ReductionStats]:
+        out = {}
+        for strategy in strategies or REDUCTION_STRATEGIES:
+            stats = ReductionStats(strategy)
+            self.copy().reduce(strategy, stats)
+            out[strategy] = stats
+        return out
+
     def get_reducible_edge(self):
         for x in self.graph:
-            for y in self.graph[x]:
-                if len(self.graph[x][y]) == 1:
-                    k, d = list(self.graph[x][y].items())[0]
-                    left = k[0]
-                    right = k[1]
-                    if self.edge_is_reducible(left, d['c'], right):
-                        return x, y, k, d
+            for y in self.graph.successors(x):
+                reducible_edge = self.reducible_edge_between(x, y)
+                if reducible_edge is not None:
+                    return reducible_edge
+
+    # returns (x, y, k, d) if there is exactly one edge x -> y and it is reducible, else None
+    def reducible_edge_between(self, x, y):
+        edges = self.graph.edges_between(x, y)
+        if len(edges) == 1:
+            (k, c), = edges.items()
+            left = k[0]
+            right = k[1]
+            if self.edge_is_reducible(left, c, right):
+                return x, y, k, {'c': c}
 
     @staticmethod
     @abstractmethod
@@ -104,7 +245,7 @@ class Module(ABC):
 
     def identify_variables(self, var1, var2):
         assert var1 in self.ring.variables and var2 in self.ring.variables
-        r_merged = Z2PolynomialRing([v for v in self.ring.variables if v != var2])
+        r_merged = Z2PolynomialRing([v for v in self.ring.variables if v != var2], self.ring.hat)
         f_merge = Z2PolynomialRing.Map(self.ring, r_merged,
                                        {v: (v if v != var2 else var1) for v in self.ring.variables})
 
@@ -118,8 +259,7 @@ class Module(ABC):
         for x, x_data in self.graph.nodes(data=True):
             out.add_generator(Module.change_module_of_generator(x, out), grading=x_data['grading'])
         for x in self.graph.nodes():
-            for _, y, k, xyk_data in self.graph.out_edges(x, keys=True, data=True):
-                c = xyk_data['c']
+            for y, k, c in self.graph.out_edge_items(x):
                 c = f_merge.apply(c)
                 out.add_edge(Module.change_module_of_generator(x, out), Module.change_module_of_generator(y, out), k, c)
         return out
@@ -131,6 +271,62 @@ class Module(ABC):
                         self.left_scalar_action, self.right_scalar_action,
                         self.graph.copy())
 
+    # a module over the same ring and algebras as this one, with no generators
+    def empty_copy(self):
+        subclass = type(self)
+        return subclass(self.ring,
+                        self.left_algebra, self.right_algebra,
+                        self.left_scalar_action, self.right_scalar_action)
+
+    # a plain, picklable description of this module's generators and edges, which does not refer to the ring or
+    # algebra objects, so it can be sent between processes and read back into a module over equal rings/algebras
+    # returns (ring variables, [(key, left idempotent, right idempotent, grading)],
+    #          [(x key, y key, left, right, coefficient)])
+    # idempotents are sorted tuples of points, left and right are tuples of factors given as sorted tuples of strands,
+    # and coefficients are tuples of packed monomials
+    def to_records(self):
+        nodes = [(x.key, tuple(sorted(x.left_idempotent.strands.keys())),
+                  tuple(sorted(x.right_idempotent.strands.keys())), data['grading'])
+                 for x, data in self.graph.nodes(data=True)]
+        edges = [(x.key, y.key, Module.factors_to_record(left), Module.factors_to_record(right), tuple(sorted(c.terms)))
+                 for x, y, (left, right), c in self.graph.edge_items()]
+        return self.ring.variable_list, nodes, edges
+
+    # adds generators and edges read from to_records() to this module
+    def add_records(self, records) -> Module:
+        variables, nodes, edges = records
+        assert variables == self.ring.variable_list, "records come from a module over a different ring"
+        generators = {}
+        for key, left_idempotent, right_idempotent, grading in nodes:
+            generators[key] = Module.TensorGenerator(self, key,
+                                                     self.left_algebra.idempotent(left_idempotent),
+                                                     self.right_algebra.idempotent(right_idempotent))
+            self.add_generator(generators[key], grading)
+        self.add_edge_records(generators, edges)
+        return self
+
+    # adds edge records (see to_records) between the given generators to this module
+    # generators - {key: TensorGenerator}
+    def add_edge_records(self, generators: Dict, edges) -> None:
+        left_factors = {}
+        right_factors = {}
+        for x_key, y_key, left, right, terms in edges:
+            if left not in left_factors:
+                left_factors[left] = Module.record_to_factors(self.left_tensor_algebra, left)
+            if right not in right_factors:
+                right_factors[right] = Module.record_to_factors(self.right_tensor_algebra, right)
+            self.add_edge(generators[x_key], generators[y_key], (left_factors[left], right_factors[right]),
+                          Z2Polynomial(self.ring, frozenset(terms)))
+
+    @staticmethod
+    def factors_to_record(g: TensorAlgebra.Generator):
+        return tuple(tuple(sorted(a.strands.items())) for a in g.factors)
+
+    @staticmethod
+    def record_to_factors(tensor_algebra: TensorAlgebra, record) -> TensorAlgebra.Generator:
+        return TensorAlgebra.Generator(tensor_algebra, tuple(tensor_algebra.algebra.generator(dict(strands))
+                                                             for strands in record))
+
     # mostly a helper method for identify_variables()
     @staticmethod
     def change_module_of_generator(x, m):
@@ -154,7 +350,8 @@ class Module(ABC):
             return False
         node_match = lambda x_data, y_data: x_data == y_data
         edge_match = lambda e1_data, e2_data: e1_data == e2_data
-        return nx.is_isomorphic(self.graph, other.graph, node_match=node_match, edge_match=edge_match)
+        return nx.is_isomorphic(self.graph.to_networkx(), other.graph.to_networkx(),
+                                node_match=node_match, edge_match=edge_match)
 
     # if self is homotopic to C (+) C[1,2] for some C, return C, else return None
     def halve(self):
@@ -178,34 +375,39 @@ class Module(ABC):
         subclass = type(self)
         return [subclass(self.ring, self.left_algebra, self.right_algebra,
                          self.left_scalar_action, self.right_scalar_action,
-                         MultiDiGraph(self.graph.subgraph(component)))
-                for component in nx.weakly_connected_components(self.graph)]
+                         self.graph.subgraph(component))
+                for component in self.graph.weakly_connected_components()]
 
     @staticmethod
     def direct_sum(modules: List):
         subclass = type(modules[0])
-        new_graph = nx.union_all([m.graph for m in modules])
+        new_graph = ModuleGraph.union_all([m.graph for m in modules])
         return subclass(modules[0].ring, modules[0].left_algebra, modules[0].right_algebra,
                         modules[0].left_scalar_action, modules[0].right_scalar_action, new_graph)
 
     def zero(self) -> Module.TensorElement:
         return Module.TensorElement(self)
 
+    # for summing many elements of this module, see Accumulator
+    def accumulator(self) -> Accumulator:
+        return Accumulator(partial(Module.TensorElement, self))
+
     # turns this bimodule into a graphviz-compatible format
-    def to_agraph(self, idempotents=True) -> AGraph:
+    # label - gives the text to show for a generator key; CTMinus.strands_label() decodes the keys of modules built
+    #   from tangles into the strands they stand for
+    def to_agraph(self, idempotents=True, label: Callable = str) -> AGraph:
         graph = AGraph(strict=False, directed=True)
         for generator, data in self.graph.nodes(data=True):
-            graph.add_node(str(generator.key) + '[' + str(data['grading'])[1:-1] + ']',
+            graph.add_node(label(generator.key) + '[' + str(data['grading'])[1:-1] + ']',
                            shape='box',
                            fontname='Arial')
-        for x, y, (left, right), d in self.graph.edges(keys=True, data=True):
-            c = d['c']
-            x_grading = self.graph.nodes(data=True)[x]['grading']
-            y_grading = self.graph.nodes(data=True)[y]['grading']
+        for x, y, (left, right), c in self.graph.edge_items():
+            x_grading = self.graph.nodes[x]['grading']
+            y_grading = self.graph.nodes[y]['grading']
             if not idempotents and self.is_idempotent_edge_data(left, c, right):
                 continue
-            graph.add_edge(str(x.key) + '[' + str(x_grading)[1:-1] + ']',
-                           str(y.key) + '[' + str(y_grading)[1:-1] + ']',
+            graph.add_edge(label(x.key) + '[' + str(x_grading)[1:-1] + ']',
+                           label(y.key) + '[' + str(y_grading)[1:-1] + ']',
                            label=' ' + str((left, c, right)) + ' ',
                            dir='forward',
                            color=self.edge_color(left, c, right),
@@ -256,14 +458,14 @@ class Module(ABC):
             else:
                 raise Exception("no action by the given polynomial")
 
-        @multimethod
-        def __rpow__(self, other: AMinus.Generator) -> Module.TensorElement:
-            return other.to_element() ** self
-
         # the tensor product A (x) (A^(x)i (x) M (x) A^(x)j) -> A^(x)i+1 (x) M (x) A^(x)j
-        @multimethod
-        def __rpow__(self, other: AMinus.Element) -> Module.TensorElement:
-            out = self.module.zero()
+        # and the tensor product A^(x)k (x) (A^(x)i (x) M (x) A^(x)j) -> A^(x)i+k (x) M (x) A^(x)j
+        def __rpow__(self, other) -> Module.TensorElement:
+            if isinstance(other, (AMinus.Generator, TensorAlgebra.Generator)):
+                other = other.to_element()
+            elif not isinstance(other, (AMinus.Element, TensorAlgebra.Element)):
+                return NotImplemented
+            out = self.module.accumulator()
 
             for g1, c1 in other.coefficients.items():
                 for g2, c2 in self.coefficients.items():
@@ -273,29 +475,11 @@ class Module(ABC):
                         else:
                             raise Exception('no left scalar action')
 
-            return out
-
-        @multimethod
-        def __rpow__(self, other: TensorAlgebra.Generator):
-            return other.to_element() ** self
-
-        @multimethod
-        def __rpow__(self, other: TensorAlgebra.Element):
-            out = self.module.zero()
-
-            for g1, c1 in other.coefficients.items():
-                for g2, c2 in self.coefficients.items():
-                    if g1.right_idempotent() == g2.leftmost_idempotent():
-                        if self.module.left_scalar_action is not None:
-                            out += (self.module.left_scalar_action.apply(c1) * c2) * (g1 ** g2)
-                        else:
-                            raise Exception('no left scalar action')
-
-            return out
+            return out.freeze()
 
         # the tensor product (A^(x)i (x) M (x) A^(x)j) (x) A -> A^(x)i (x) M (x) A^(x)j+1
         def __pow__(self, other: AMinus.Element) -> Module.TensorElement:
-            out = self.module.zero()
+            out = self.module.accumulator()
 
             for g1, c1 in self.coefficients.items():
                 for g2, c2 in other.coefficients.items():
@@ -305,15 +489,14 @@ class Module(ABC):
                         else:
                             raise Exception('no right scalar action')
 
-            return out
+            return out.freeze()
 
-        @multimethod
-        def __eq__(self, other: Module.TensorElement) -> bool:
-            return self.module == other.module and self.coefficients == other.coefficients
-
-        @multimethod
-        def __eq__(self, other: Module.TensorGenerator) -> bool:
-            return self == other.to_element()
+        def __eq__(self, other) -> bool:
+            if isinstance(other, Module.TensorElement):
+                return self.module == other.module and self.coefficients == other.coefficients
+            if isinstance(other, Module.TensorGenerator):
+                return self == other.to_element()
+            return NotImplemented
 
         def __hash__(self):
             return hash((self.module, self.coefficients))
@@ -323,16 +506,46 @@ class Module(ABC):
 
     # represents a generator of A^(x)i (x) M (x) A^(x)j as a module over the base ring of M
     class TensorGenerator:
-        def __init__(self, module: Module, key,
-                     left_idempotent: AMinus.Generator, right_idempotent: AMinus.Generator,
-                     left: TensorAlgebra.Generator = None,
-                     right: TensorAlgebra.Generator = None):
-            self.module = module
-            self.key = key
-            self.left_idempotent = left_idempotent
-            self.right_idempotent = right_idempotent
-            self.left = left or module.left_tensor_algebra.one_generator()
-            self.right = right or module.right_tensor_algebra.one_generator()
+        # generators of the module itself, i.e. without algebra factors, are interned in module.generator_table:
+        # constructing the same one twice gives back the same object, so two of them are equal exactly when they
+        # are the same object. generators with algebra factors are made fresh every time
+        def __new__(cls, module: Module, key,
+                    left_idempotent: AMinus.Generator, right_idempotent: AMinus.Generator,
+                    left: TensorAlgebra.Generator = None,
+                    right: TensorAlgebra.Generator = None):
+            left = left or module.left_tensor_algebra.one_generator()
+            right = right or module.right_tensor_algebra.one_generator()
+            interned = left.num_factors() == 0 and right.num_factors() == 0
+            if interned:
+                table_key = (key, left_idempotent, right_idempotent)
+                out = module.generator_table.get(table_key)
+                if out is not None:
+                    return out
+            out = super().__new__(cls)
+            out.module = module
+            out.key = key
+            out.left_idempotent = left_idempotent
+            out.right_idempotent = right_idempotent
+            out.left = left
+            out.right = right
+            out.interned = interned
+            out._hash = None
+            if interned:
+                module.generator_table[table_key] = out
+            return out
+
+        def __reduce__(self):
+            return Module.TensorGenerator.unpickle, (self.module, self.key, self.left_idempotent,
+                                                     self.right_idempotent, self.left, self.right)
+
+        # the generators of a module are unpickled before the module's own state is restored, so the first one
+        # starts its generator table
+        @staticmethod
+        def unpickle(module: Module, key, left_idempotent: AMinus.Generator, right_idempotent: AMinus.Generator,
+                     left: TensorAlgebra.Generator, right: TensorAlgebra.Generator) -> Module.TensorGenerator:
+            if 'generator_table' not in module.__dict__:
+                module.generator_table = weakref.WeakValueDictionary()
+            return Module.TensorGenerator(module, key, left_idempotent, right_idempotent, left, right)
 
         # converts this generator to an actual element
         def to_element(self) -> Module.TensorElement:
@@ -367,49 +580,37 @@ class Module(ABC):
             return other * self.to_element()
 
         # tensor product
-        @multimethod
-        def __pow__(self, other: AMinus.Generator) -> Module.TensorGenerator:
-            assert self.rightmost_idempotent() == other.left_idempotent()
-            return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
-                                          self.left, self.right ** other)
-
-        # tensor product
-        @multimethod
-        def __pow__(self, other: AMinus.Element) -> Module.TensorElement:
-            return self.to_element() ** other
-
-        # tensor product
-        # assumes other is a tuple of generators or elements
-        @multimethod
-        def __pow__(self, other: TensorAlgebra.Generator) -> Module.TensorGenerator:
-            return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent, self.left,
-                                          self.right ** other)
-
-        @multimethod
-        def __pow__(self, other: TensorAlgebra.Element) -> Module.TensorElement:
-            out = self.module.zero()
-            for gen, coefficient in other.coefficients.items():
-                out += coefficient * (self ** gen)
-            return out
-
-        # tensor product
-        @multimethod
-        def __rpow__(self, other: AMinus.Generator) -> Module.TensorGenerator:
-            assert other.right_idempotent() == self.leftmost_idempotent()
-            return Module.TensorGenerator(self.module, self.key,
-                                          self.left_idempotent, self.right_idempotent, other ** self.left, self.right)
+        def __pow__(self, other):
+            if isinstance(other, AMinus.Generator):
+                assert self.rightmost_idempotent() == other.left_idempotent()
+                return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
+                                              self.left, self.right ** other)
+            # assumes other is a tuple of generators or elements
+            if isinstance(other, TensorAlgebra.Generator):
+                return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
+                                              self.left, self.right ** other)
+            if isinstance(other, AMinus.Element):
+                return self.to_element() ** other
+            if isinstance(other, TensorAlgebra.Element):
+                out = self.module.accumulator()
+                for gen, coefficient in other.coefficients.items():
+                    out += coefficient * (self ** gen)
+                return out.freeze()
+            return NotImplemented
 
         # tensor product
-        @multimethod
-        def __rpow__(self, other: AMinus.Element) -> Module.TensorElement:
-            return other ** self.to_element()
-
-        # tensor product
-        # assumes other is a tuple of generators or elements
-        @multimethod
-        def __rpow__(self, other: TensorAlgebra.Generator) -> Module.TensorGenerator:
-            return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
-                                          other ** self.left, self.right)
+        def __rpow__(self, other):
+            if isinstance(other, AMinus.Generator):
+                assert other.right_idempotent() == self.leftmost_idempotent()
+                return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
+                                              other ** self.left, self.right)
+            # assumes other is a tuple of generators or elements
+            if isinstance(other, TensorAlgebra.Generator):
+                return Module.TensorGenerator(self.module, self.key, self.left_idempotent, self.right_idempotent,
+                                              other ** self.left, self.right)
+            if isinstance(other, AMinus.Element):
+                return other ** self.to_element()
+            return NotImplemented
 
         def __str__(self):
             return str((self.left, self.key, self.right))
@@ -417,19 +618,55 @@ class Module(ABC):
         def __repr__(self):
             return str((self.left, self.key, self.right))
 
-        @multimethod
-        def __eq__(self, other: Module.TensorGenerator):
-            return self.module == other.module and \
-                   self.key == other.key and \
-                   self.left_idempotent == other.left_idempotent and \
-                   self.right_idempotent == other.right_idempotent and \
-                   self.left == other.left and \
-                   self.right == other.right
-
-        @multimethod
         def __eq__(self, other):
+            if self is other:
+                return True
+            if isinstance(other, Module.TensorGenerator):
+                if self.interned and other.interned:
+                    return False
+                return self.module == other.module and \
+                       self.key == other.key and \
+                       self.left_idempotent == other.left_idempotent and \
+                       self.right_idempotent == other.right_idempotent and \
+                       self.left == other.left and \
+                       self.right == other.right
             return self.to_element() == other
 
         def __hash__(self):
-            return hash((self.left, self.module, self.key,
-                         self.left_idempotent, self.right_idempotent, self.right))
+            if self._hash is None:
+                self._hash = hash((self.left, self.module, self.key,
+                                   self.left_idempotent, self.right_idempotent, self.right))
+            return self._hash
+
+
+# the orders in which Module.reduce_component() can cancel edges
+REDUCTION_STRATEGIES = ('fifo', 'degree', 'grading')
+
+
+# statistics gathered while reducing a module
+class ReductionStats:
+    def __init__(self, strategy: str = None):
+        self.strategy = strategy
+        self.cancellations = 0
+        self.initial_edges = None
+        self.edges = None
+        self.peak_edges = None
+        self.start_time = None
+        self.seconds = None
+
+    def start(self, num_edges: int) -> None:
+        self.initial_edges = self.edges = self.peak_edges = num_edges
+        self.start_time = time.perf_counter()
+
+    # records one cancellation, which changed the number of edges by edge_change
+    def cancelled(self, edge_change: int) -> None:
+        self.cancellations += 1
+        self.edges += edge_change
+        self.peak_edges = max(self.peak_edges, self.edges)
+
+    def finish(self) -> None:
+        self.seconds = time.perf_counter() - self.start_time
+
+    def __repr__(self) -> str:
+        return f"{self.strategy}: {self.cancellations} cancellations, {self.initial_edges} -> {self.edges} edges " \
+               f"(peak {self.peak_edges}), {self.seconds:.3f}s"
@@ -0,0 +1,328 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Set
+
+from networkx import MultiDiGraph
+
+
+# the graph of generators and structure maps of a Module
+# a directed multigraph whose nodes are generators with a data dict (holding the grading), and whose edges are
+# labelled by an edge key (for bimodules, the pair (left, right) of tensor algebra generators) and carry a
+# coefficient. nodes are stored under integer ids and edge keys are interned, so each edge costs one dict entry
+# {key id: coefficient}, shared between the forward and the reverse adjacency. a key is dropped, and its id reused,
+# once no edge has it any more.
+# supports the parts of the networkx MultiDiGraph interface used on modules, with edge data given as {'c': c};
+# the *_items methods skip building those dicts, and to_networkx() converts to an actual MultiDiGraph
+class ModuleGraph:
+    def __init__(self):
+        # {node: id}, {id: node}, {id: data}
+        self._ids = {}
+        self._nodes = {}
+        self._data = {}
+        self._next_id = 0
+        # {key: key id}, [key], [the number of edges with that key], [key ids that are not in use]
+        self._key_ids = {}
+        self._keys = []
+        self._key_counts = []
+        self._free_key_ids = []
+        # {source id: {target id: {key id: coefficient}}} and {target id: {source id: the same dict}}
+        self._succ = {}
+        self._pred = {}
+        self._num_edges = 0
+
+    @staticmethod
+    def from_networkx(graph: MultiDiGraph) -> ModuleGraph:
+        out = ModuleGraph()
+        for x, data in graph.nodes(data=True):
+            out.add_node(x, **data)
+        for x, y, k, d in graph.edges(keys=True, data=True):
+            out.add_edge(x, y, k, d['c'])
+        return out
+
+    def to_networkx(self) -> MultiDiGraph:
+        out = MultiDiGraph()
+        for x, data in self.nodes(data=True):
+            out.add_node(x, **data)
+        for x, y, k, c in self.edge_items():
+            out.add_edge(x, y, key=k, c=c)
+        return out
+
+    def _key_id(self, k) -> int:
+        key_id = self._key_ids.get(k)
+        if key_id is None:
+            if self._free_key_ids:
+                key_id = self._free_key_ids.pop()
+                self._keys[key_id] = k
+            else:
+                key_id = len(self._keys)
+                self._keys.append(k)
+                self._key_counts.append(0)
+            self._key_ids[k] = key_id
+        return key_id
+
+    # forgets the edges with the given key ids, and the keys no edge has any more
+    def _release_keys(self, key_ids: Iterable) -> None:
+        for key_id in key_ids:
+            self._num_edges -= 1
+            self._key_counts[key_id] -= 1
+            if self._key_counts[key_id] == 0:
+                del self._key_ids[self._keys[key_id]]
+                self._keys[key_id] = None
+                self._free_key_ids.append(key_id)
+
+    # nodes
+
+    @property
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    def add_node(self, x, **data) -> None:
+        i = self._ids.get(x)
+        if i is None:
+            i = self._ids[x] = self._next_id
+            self._next_id += 1
+            self._nodes[i] = x
+            self._data[i] = {}
+            self._succ[i] = {}
+            self._pred[i] = {}
+        self._data[i].update(data)
+
+    def remove_node(self, x) -> None:
+        i = self._ids.pop(x)
+        for j, edges in self._succ.pop(i).items():
+            self._release_keys(edges)
+            if j != i:
+                del self._pred[j][i]
+        for j, edges in self._pred.pop(i).items():
+            if j != i:
+                self._release_keys(edges)
+                del self._succ[j][i]
+        del self._nodes[i]
+        del self._data[i]
+
+    def remove_nodes_from(self, nodes: Iterable) -> None:
+        for x in nodes:
+            if x in self._ids:
+                self.remove_node(x)
+
+    def number_of_nodes(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, x) -> bool:
+        return x in self._ids
+
+    def __iter__(self):
+        return iter(list(self._nodes.values()))
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def successors(self, x) -> List:
+        return [self._nodes[j] for j in self._succ[self._ids[x]]]
+
+    def predecessors(self, y) -> List:
+        return [self._nodes[j] for j in self._pred[self._ids[y]]]
+
+    def out_degree(self, x) -> int:
+        return sum(len(edges) for edges in self._succ[self._ids[x]].values())
+
+    def in_degree(self, y) -> int:
+        return sum(len(edges) for edges in self._pred[self._ids[y]].values())
+
+    # edges
+
+    @property
+    def edges(self) -> EdgeView:
+        return EdgeView(self)
+
+    def add_edge(self, x, y, key, c) -> None:
+        for node in (x, y):
+            if node not in self._ids:
+                self.add_node(node)
+        i = self._ids[x]
+        j = self._ids[y]
+        edges = self._succ[i].get(j)
+        if edges is None:
+            edges = self._succ[i][j] = self._pred[j][i] = {}
+        key_id = self._key_id(key)
+        if key_id not in edges:
+            self._num_edges += 1
+            self._key_counts[key_id] += 1
+        edges[key_id] = c
+
+    def remove_edge(self, x, y, key) -> None:
+        i = self._ids[x]
+        j = self._ids[y]
+        edges = self._succ[i][j]
+        key_id = self._key_ids[key]
+        del edges[key_id]
+        self._release_keys([key_id])
+        if not edges:
+            del self._succ[i][j]
+            del self._pred[j][i]
+
+    # the coefficient of the edge x -> y with the given key, or None if there is no such edge
+    def coefficient(self, x, y, key):
+        i = self._ids.get(x)
+        j = self._ids.get(y)
+        key_id = self._key_ids.get(key)
+        if i is None or j is None or key_id is None:
+            return None
+        return self._succ[i].get(j, {}).get(key_id)
+
+    # adds c to the coefficient of the edge x -> y with the given key, removing the edge if that makes it zero
+    def add_coefficient(self, x, y, key, c) -> None:
+        current = self.coefficient(x, y, key)
+        if current is not None:
+            c = current + c
+        if not c.is_zero():
+            self.add_edge(x, y, key, c)
+        elif current is not None:
+            self.remove_edge(x, y, key)
+
+    # {key: coefficient} for the edges x -> y
+    def edges_between(self, x, y) -> Dict:
+        i = self._ids.get(x)
+        j = self._ids.get(y)
+        if i is None or j is None:
+            return {}
+        return {self._keys[key_id]: c for key_id, c in self._succ[i].get(j, {}).items()}
+
+    # [(y, key, coefficient)] for the edges out of x
+    def out_edge_items(self, x) -> List:
+        keys = self._keys
+        nodes = self._nodes
+        return [(nodes[j], keys[key_id], c)
+                for j, edges in self._succ[self._ids[x]].items() for key_id, c in edges.items()]
+
+    # [(w, key, coefficient)] for the edges into y
+    def in_edge_items(self, y) -> List:
+        keys = self._keys
+        nodes = self._nodes
+        return [(nodes[j], keys[key_id], c)
+                for j, edges in self._pred[self._ids[y]].items() for key_id, c in edges.items()]
+
+    # [(x, y, key, coefficient)] for every edge
+    def edge_items(self) -> List:
+        keys = self._keys
+        nodes = self._nodes
+        return [(nodes[i], nodes[j], keys[key_id], c)
+                for i, targets in self._succ.items() for j, edges in targets.items() for key_id, c in edges.items()]
+
+    def out_edges(self, x, keys: bool = False, data: bool = False) -> List:
+        return [ModuleGraph._edge_tuple(x, y, k, c, keys, data) for y, k, c in self.out_edge_items(x)]
+
+    def in_edges(self, y, keys: bool = False, data: bool = False) -> List:
+        return [ModuleGraph._edge_tuple(w, y, k, c, keys, data) for w, k, c in self.in_edge_items(y)]
+
+    @staticmethod
+    def _edge_tuple(x, y, k, c, keys: bool, data: bool):
+        return (x, y) + ((k,) if keys else ()) + (({'c': c},) if data else ())
+
+    def get_edge_data(self, x, y, key):
+        c = self.coefficient(x, y, key)
+        return None if c is None else {'c': c}
+
+    def number_of_edges(self, x=None, y=None) -> int:
+        if x is None:
+            return self._num_edges
+        i = self._ids.get(x)
+        j = self._ids.get(y)
+        if i is None or j is None:
+            return 0
+        return len(self._succ[i].get(j, {}))
+
+    # {y: {key: {'c': coefficient}}}, as in networkx
+    def __getitem__(self, x) -> Dict:
+        out = {}
+        for y, k, c in self.out_edge_items(x):
+            out.setdefault(y, {})[k] = {'c': c}
+        return out
+
+    # whole graphs
+
+    def copy(self) -> ModuleGraph:
+        return self.subgraph(self._ids.keys())
+
+    # the subgraph on the given nodes, as a new graph
+    def subgraph(self, nodes: Iterable) -> ModuleGraph:
+        nodes = set(nodes)
+        out = ModuleGraph()
+        for i, x in self._nodes.items():
+            if x in nodes:
+                out.add_node(x, **self._data[i])
+        for i, targets in self._succ.items():
+            if self._nodes[i] not in nodes:
+                continue
+            for j, edges in targets.items():
+                if self._nodes[j] not in nodes:
+                    continue
+                for key_id, c in edges.items():
+                    out.add_edge(self._nodes[i], self._nodes[j], self._keys[key_id], c)
+        return out
+
+    def weakly_connected_components(self) -> List[Set]:
+        out = []
+        seen = set()
+        for start in self._nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            component = [start]
+            for i in component:
+                for j in list(self._succ[i]) + list(self._pred[i]):
+                    if j not in seen:
+                        seen.add(j)
+                        component.append(j)
+            out.append({self._nodes[i] for i in component})
+        return out
+
+    # the disjoint union of the given graphs
+    @staticmethod
+    def union_all(graphs: List[ModuleGraph]) -> ModuleGraph:
+        out = ModuleGraph()
+        for graph in graphs:
+            for x, data in graph.nodes(data=True):
+                if x in out:
+                    raise Exception('graphs in a union are not disjoint')
+                out.add_node(x, **data)
+            for x, y, k, c in graph.edge_items():
+                out.add_edge(x, y, k, c)
+        return out
+
+
+# graph.nodes, as in networkx: iterable, with graph.nodes[x] the data of x and graph.nodes(data=True) the pairs
+class NodeView:
+    def __init__(self, graph: ModuleGraph):
+        self.graph = graph
+
+    def __call__(self, data: bool = False) -> List:
+        if data:
+            return [(x, self.graph._data[i]) for i, x in self.graph._nodes.items()]
+        return list(self.graph._nodes.values())
+
+    def __getitem__(self, x) -> Dict:
+        return self.graph._data[self.graph._ids[x]]
+
+    def __iter__(self):
+        return iter(self())
+
+    def __len__(self) -> int:
+        return self.graph.number_of_nodes()
+
+    def __contains__(self, x) -> bool:
+        return x in self.graph
+
+
+# graph.edges, as in networkx: iterable over pairs (x, y), with graph.edges(keys=True, data=True) the full edges
+class EdgeView:
+    def __init__(self, graph: ModuleGraph):
+        self.graph = graph
+
+    def __call__(self, keys: bool = False, data: bool = False) -> List:
+        return [ModuleGraph._edge_tuple(x, y, k, c, keys, data) for x, y, k, c in self.graph.edge_items()]
+
+    def __iter__(self):
+        return iter(self())
+
+    def __len__(self) -> int:
+        return self.graph.number_of_edges()
@@ -2,6 +2,8 @@ from __future__ import annotations
 from typing import Dict, Optional
 import itertools
 
+import numpy
+
 
 class StrandDiagram:
     # orange_strands: {strand_index: (left_pos, middle_pos, right_pos)}
@@ -11,13 +13,18 @@ class StrandDiagram:
         self.orange_strands = orange_strands
         self.orange_signs = orange_signs
         self.black_strands = black_strands
+        self._reflection = None
+        self._arrays = None
 
+    # the mirror image of this diagram, built on first use
     def reflect(self):
-        return StrandDiagram(
-            {orange: tuple(pos[::-1]) for orange, pos in self.orange_strands.items()},
-            {orange: sign for orange, sign in self.orange_signs.items()},
-            {black: tuple(pos[::-1]) for black, pos in self.black_strands.items()}
-        )
+        if self._reflection is None:
+            self._reflection = StrandDiagram(
+                {orange: tuple(pos[::-1]) for orange, pos in self.orange_strands.items()},
+                {orange: sign for orange, sign in self.orange_signs.items()},
+                {black: tuple(pos[::-1]) for black, pos in self.black_strands.items()}
+            )
+        return self._reflection
 
     def orange_left_pos(self, orange_index: int):
         return self.orange_strands[orange_index][0]
@@ -294,31 +301,41 @@ class StrandDiagram:
 
         return out
 
+    # the number of times the strand with positions (left, middle, right) crosses the strands with the given positions
+    @staticmethod
+    def num_crossings(strands, strand) -> int:
+        return sum(StrandDiagram.times_crossed(*other[:3], *strand) for other in strands)
+
+    # this diagram as a StrandArrays, built on first use
+    def arrays(self) -> StrandArrays:
+        if self._arrays is None:
+            self._arrays = StrandArrays(self)
+        return self._arrays
+
     # more crossing counts to do gradings
     def num_orange_black_pos_crossings(self) -> int:
-        return sum(self.orange_times_crossed_black(orange, black)
-                   for orange in self.orange_strands if self.orange_signs[orange] == 1 for black in self.black_strands)
+        arrays = self.arrays()
+        return int(arrays.positive @ arrays.crossings @ arrays.black)
 
     def num_orange_black_neg_crossings(self) -> int:
-        return sum(self.orange_times_crossed_black(orange, black)
-                   for orange in self.orange_strands if self.orange_signs[orange] == -1 for black in self.black_strands)
+        arrays = self.arrays()
+        return int(arrays.negative @ arrays.crossings @ arrays.black)
 
+    # counts the crossings of positive orange strands with any orange strand
     def num_orange_orange_pos_crossings(self) -> int:
-        return sum(self.orange_times_crossed_orange(o1, o2)
-                   for o1 in self.orange_strands if self.orange_signs[o1] == 1 for o2 in self.orange_strands if
-                   self.orange_signs[o1] == 1)
+        arrays = self.arrays()
+        return int(arrays.positive @ arrays.crossings @ arrays.orange)
 
     def num_orange_orange_neg_crossings(self) -> int:
-        return sum(self.orange_times_crossed_orange(o1, o2)
-                   for o1 in self.orange_strands if self.orange_signs[o1] == -1 for o2 in self.orange_strands if
-                   self.orange_signs[o2] == -1)
+        arrays = self.arrays()
+        return int(arrays.negative @ arrays.crossings @ arrays.negative)
 
     def num_black_black_crossings(self) -> int:
-        return sum(self.black_times_crossed_black(b1, b2)
-                   for b1 in self.black_strands for b2 in self.black_strands) // 2
+        arrays = self.arrays()
+        return int(arrays.black @ arrays.crossings @ arrays.black) // 2
 
     def num_negative_orange(self) -> int:
-        return sum(1 for o in self.orange_strands if self.orange_signs[o] == -1)
+        return int(self.arrays().negative.sum())
 
     def nobpc(self) -> int:
         return self.num_orange_black_pos_crossings()
@@ -338,18 +355,57 @@ class StrandDiagram:
     def nno(self) -> int:
         return self.num_negative_orange()
 
+    # the crossing counts of the left half of this diagram (the orange strands reaching the left edge and the black
+    # strands ending in the middle) and of its right half (the orange strands reaching the right edge and the black
+    # strands starting in the middle), taken straight from the crossing matrices
+    # right.nbbc() - right.nobpc() + right.noopc() - left.nbbc() + left.nobnc() - left.noonc() - left.nno()
     def maslov(self) -> int:
-        left_black = {k: self.black_strands[k] for k in self.black_strands.keys() if self.black_strands[k][2] is None}
-        right_black = {k: self.black_strands[k] for k in self.black_strands.keys() if self.black_strands[k][0] is None}
-        left_orange = {k: [self.orange_strands[k][0], self.orange_strands[k][1], None]
-                       for k in self.orange_strands.keys() if self.orange_strands[k][0] is not None}
-        right_orange = {k: [None, self.orange_strands[k][1], self.orange_strands[k][2], None]
-                        for k in self.orange_strands.keys() if self.orange_strands[k][2] is not None}
-        left = StrandDiagram(left_orange, self.orange_signs, left_black)
-        right = StrandDiagram(right_orange, self.orange_signs, right_black)
-        m = right.nbbc() - right.nobpc() + right.noopc() - left.nbbc() + left.nobnc() - left.noonc() - left.nno()
-        return m
+        arrays = self.arrays()
+        left_orange = arrays.orange * arrays.has_left
+        right_orange = arrays.orange * arrays.has_right
+        left_black = arrays.black * (1 - arrays.has_right)
+        right_black = arrays.black * (1 - arrays.has_left)
+        left_negative = left_orange * arrays.negative
+        right_positive = right_orange * arrays.positive
+        right = right_black @ arrays.right_crossings @ right_black // 2 \
+            + right_positive @ arrays.right_crossings @ (right_orange - right_black)
+        left = left_black @ arrays.left_crossings @ left_black // 2 \
+            + left_negative @ arrays.left_crossings @ (left_negative - left_black) + left_negative.sum()
+        return int(right - left)
 
     def twoalexander(self) -> int:
         twoa = self.nobnc() - self.nobpc() + self.noopc() - self.noonc() - self.nno()
         return twoa
+
+
+# the strands of a StrandDiagram as arrays, to count all their crossings at once
+# strands are numbered with the orange strands first, then the black strands; the vectors are 0/1 indicators over
+# that numbering, so that sums of crossings between two sets of strands are products u @ crossings @ v
+class StrandArrays:
+    def __init__(self, diagram: StrandDiagram):
+        self.oranges = list(diagram.orange_strands)
+        self.blacks = list(diagram.black_strands)
+        positions = numpy.array([[numpy.nan if p is None else p for p in diagram.orange_strands[o][:3]]
+                                 for o in self.oranges] +
+                                [[numpy.nan if p is None else p for p in diagram.black_strands[b][:3]]
+                                 for b in self.blacks], dtype=float).reshape(-1, 3)
+        self.signs = numpy.array([diagram.orange_signs[o] for o in self.oranges] + [0] * len(self.blacks), dtype=int)
+        self.orange = numpy.abs(self.signs)
+        self.black = 1 - self.orange
+        self.positive = (self.signs == 1).astype(int)
+        self.negative = (self.signs == -1).astype(int)
+        present = ~numpy.isnan(positions)
+        self.has_left = present[:, 0].astype(int)
+        self.has_right = present[:, 2].astype(int)
+        # the number of times each pair of strands cross in the left half, the right half, and overall
+        left, middle, right = positions.T
+        self.left_crossings = StrandArrays.half_crossings(left, middle, present[:, 0] & present[:, 1])
+        self.right_crossings = StrandArrays.half_crossings(middle, right, present[:, 1] & present[:, 2])
+        self.crossings = self.left_crossings + self.right_crossings
+
+    # whether the strands going from positions p to positions q cross each other, as a matrix of 0s and 1s
+    # only strands with both ends present can cross
+    @staticmethod
+    def half_crossings(p: numpy.ndarray, q: numpy.ndarray, present: numpy.ndarray) -> numpy.ndarray:
+        crossed = (p[:, None] < p[None, :]) ^ (q[:, None] < q[None, :])
+        return (crossed & present[:, None] & present[None, :]).astype(int)
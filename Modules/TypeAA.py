@@ -1,8 +1,7 @@
 from __future__ import annotations
 
-from networkx import MultiDiGraph
-
 from Modules.Module import Module
+from Modules.ModuleGraph import ModuleGraph
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
 
@@ -11,7 +10,7 @@ from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
 class TypeAA(Module):
     def __init__(self, ring: Z2PolynomialRing, left_algebra: AMinus, right_algebra: AMinus,
                  left_scalar_action: Z2PolynomialRing.Map, right_scalar_action: Z2PolynomialRing.Map,
-                 graph: MultiDiGraph = None):
+                 graph: ModuleGraph = None):
         super().__init__(ring, left_algebra, right_algebra, left_scalar_action, right_scalar_action, graph)
 
     @staticmethod
@@ -38,19 +37,22 @@ class TypeAA(Module):
                and c == c.ring.one()
 
     def reduce_edge(self, x, y, k, d) -> None:
-        in_edges = list(self.graph.in_edges(y, keys=True, data=True))
-        out_edges = list(self.graph.out_edges(x, keys=True, data=True))
+        in_edges = self.graph.in_edge_items(y)
+        out_edges = self.graph.out_edge_items(x)
 
         self.graph.remove_nodes_from([x, y])
 
-        for w, _, (left_wy, right_wy), d_wy in in_edges:
+        # {input: the sum of the zigzags starting at it}
+        outputs = {}
+        for w, (left_wy, right_wy), c_wy in in_edges:
             if w == x or w == y:
                 continue
-            c_wy = d_wy['c']
-            for _, z, (left_xz, right_xz), d_xz in out_edges:
+            for z, (left_xz, right_xz), c_xz in out_edges:
                 if z == x or z == y:
                     continue
-                c_xz = d_xz['c']
-                self.add_structure_map(
-                    (left_xz ** left_wy) ** w ** (right_wy ** right_xz),
-                    c_wy * c_xz * z)
+                input = (left_xz ** left_wy) ** w ** (right_wy ** right_xz)
+                if input not in outputs:
+                    outputs[input] = self.accumulator()
+                outputs[input] += c_wy * c_xz * z
+        for input, output in outputs.items():
+            self.add_structure_map(input, output.freeze())
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Tuple
-from networkx import MultiDiGraph
+from typing import List, Tuple, Dict
 
 from Modules.Module import Module
+from Modules.ModuleGraph import ModuleGraph
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.TensorAlgebra import TensorAlgebra
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
@@ -13,7 +13,7 @@ from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
 class TypeDA(Module):
     def __init__(self, ring: Z2PolynomialRing, left_algebra: AMinus, right_algebra: AMinus,
                  left_scalar_action: Z2PolynomialRing.Map, right_scalar_action: Z2PolynomialRing.Map,
-                 graph: MultiDiGraph = None):
+                 graph: ModuleGraph = None):
         super().__init__(ring, left_algebra, right_algebra, left_scalar_action, right_scalar_action, graph)
 
     @staticmethod
@@ -39,28 +39,44 @@ class TypeDA(Module):
                and c == c.ring.one()
 
     def reduce_edge(self, x, y, k, d) -> None:
-        in_edges = list(self.graph.in_edges(y, keys=True, data=True))
-        out_edges = list(self.graph.out_edges(x, keys=True, data=True))
+        in_edges = self.graph.in_edge_items(y)
+        out_edges = self.graph.out_edge_items(x)
 
         self.graph.remove_nodes_from([x, y])
 
         left = k[0]
 
-        for w, _, (left_wy, right_wy), d_wy in in_edges:
+        for w, (left_wy, right_wy), c_wy in in_edges:
             if w == x or w == y:
                 continue
-            c_wy = d_wy['c']
-            for _, z, (left_xz, right_xz), d_xz in out_edges:
+            # this product only depends on w, so compute it once for every z
+            left_wyx = left_wy.to_algebra() * left.to_algebra()
+            # {right_xz: the sum of the zigzags w -> y -> x -> z with that right input}
+            outputs = {}
+            for z, (left_xz, right_xz), c_xz in out_edges:
                 if z == x or z == y:
                     continue
-                c_xz = d_xz['c']
-                self.add_structure_map(
-                    w ** (right_wy ** right_xz),
-                    c_wy * c_xz * ((left_wy.to_algebra() * left.to_algebra() * left_xz.to_algebra()) ** z))
+                if right_xz not in outputs:
+                    outputs[right_xz] = self.accumulator()
+                outputs[right_xz] += c_wy * c_xz * ((left_wyx * left_xz.to_algebra()) ** z)
+            for right_xz, output in outputs.items():
+                self.add_structure_map(w ** (right_wy ** right_xz), output.freeze())
 
     # tensor product of type DA structures
     # assumes self is bounded, other may or may not be
     def __pow__(self, other: TypeDA) -> TypeDA:
+        return self.tensor(other)
+
+    # self ** other
+    # stats - if given, records how many pairs of generators were matched up and how many were skipped
+    # reduce - if True, cancel reducible edges while the product is being built, as soon as all the edges into and
+    #   out of both ends are known, so that the whole unreduced product never has to be held at once; a generator
+    #   of the product is only added once it is reached, as the source or the target of an edge.
+    #   a generator (x_m, x_n) has all its out-edges once x_m has been handled, and all its in-edges once every
+    #   in-neighbour of x_m has been handled. the result has no reducible edges left and is homotopy equivalent to
+    #   the product, but it need not be the module reducing afterwards gives: a zigzag can add edges at generators
+    #   whose edges are not all known yet, so the cancellations happen against a different graph
+    def tensor(self, other: TypeDA, stats: TensorStats = None, reduce: bool = False) -> TypeDA:
         assert self.right_algebra == other.left_algebra
 
         left_right_iso = Z2PolynomialRing.Map.identity(other.left_algebra.ring, self.right_algebra.ring)
@@ -69,47 +85,125 @@ class TypeDA(Module):
         out = TypeDA(in_m.target, self.left_algebra, other.right_algebra,
                      in_m.compose(self.left_scalar_action), in_n.compose(other.right_scalar_action))
 
-        for x_m, x_m_data in self.graph.nodes(data=True):
-            for x_n, x_n_data in other.graph.nodes(data=True):
-                x_m_grading = x_m_data['grading']
-                x_n_grading = x_n_data['grading']
-                if x_m.right_idempotent == x_n.left_idempotent:
-                    out.add_generator(Module.TensorGenerator(out, (x_m.key, x_n.key),
-                                                             x_m.left_idempotent, x_n.right_idempotent),
-                                      (x_m_grading[0] + x_n_grading[0], x_m_grading[1] + x_n_grading[1]))
-
+        # only generators whose idempotents agree are tensored together, so group other's by left idempotent
+        other_by_idempotent = {}
+        for x_n in other.graph.nodes:
+            other_by_idempotent.setdefault(x_n.left_idempotent, []).append(x_n)
+
+        # the generator (x_m, x_n) of the product, added to it with its grading if it is not there yet
+        def product_generator(x_m, x_n):
+            x = Module.TensorGenerator(out, (x_m.key, x_n.key), x_m.left_idempotent, x_n.right_idempotent)
+            if x not in out.graph:
+                x_m_grading = self.graph.nodes[x_m]['grading']
+                x_n_grading = other.graph.nodes[x_n]['grading']
+                out.add_generator(x, (x_m_grading[0] + x_n_grading[0], x_m_grading[1] + x_n_grading[1]))
+            return x
+
+        num_pairs = sum(len(other_by_idempotent.get(x_m.right_idempotent, ())) for x_m in self.graph.nodes)
+        if stats is not None:
+            stats.pairs_visited += num_pairs
+            stats.pairs_skipped += self.graph.number_of_nodes() * other.graph.number_of_nodes() - num_pairs
+
+        if reduce:
+            # {x_m: the number of x_m and its in-neighbours that have not been handled yet}
+            unhandled = {x_m: len(set(self.graph.predecessors(x_m)) | {x_m}) for x_m in self.graph.nodes}
+            # generators of the product whose edges are all known
+            closed = set()
+            worklist = {}
+        else:
+            for x_m in self.graph.nodes:
+                for x_n in other_by_idempotent.get(x_m.right_idempotent, ()):
+                    product_generator(x_m, x_n)
+
+        # delta_n only depends on the algebra elements fed in and where it starts, and the same ones come up again
+        # and again, so remember them for the whole product
+        delta_n_memo = {}
+        out_edges_by_left = {}
         for x_m in self.graph.nodes:
-            for x_n in other.graph.nodes:
-                if x_m.right_idempotent != x_n.left_idempotent:
-                    continue
-                x = Module.TensorGenerator(out, (x_m.key, x_n.key),
-                                           x_m.left_idempotent, x_n.right_idempotent)
-                for _, y_m, (left_m, right_m), d_m in self.graph.out_edges(x_m, keys=True, data=True):
-                    for right_n, y_n, c_n in other.delta_n(right_m, x_n):
+            for x_n in other_by_idempotent.get(x_m.right_idempotent, ()):
+                x = product_generator(x_m, x_n)
+                # {right_n: the output of x ** right_n}
+                outputs = {}
+                for y_m, (left_m, right_m), c_m in self.graph.out_edge_items(x_m):
+                    for right_n, y_n, c_n in other.delta_n(right_m, x_n, delta_n_memo, out_edges_by_left):
                         if y_m.right_idempotent != y_n.left_idempotent:
                             continue
-                        c_m = d_m['c']
-                        y = Module.TensorGenerator(out, (y_m.key, y_n.key),
-                                                   y_m.left_idempotent, y_n.right_idempotent)
-                        out.add_structure_map(
-                            x ** right_n,
-                            left_m ** (in_m.apply(c_m) * in_n.apply(c_n) * y))
+                        y = product_generator(y_m, y_n)
+                        if right_n not in outputs:
+                            outputs[right_n] = out.accumulator()
+                        outputs[right_n] += left_m ** (in_m.apply(c_m) * in_n.apply(c_n) * y)
+                for right_n, output in outputs.items():
+                    out.add_structure_map(x ** right_n, output.freeze())
+
+            if reduce:
+                for z_m in set(self.graph.successors(x_m)) | {x_m}:
+                    unhandled[z_m] -= 1
+                    if unhandled[z_m] == 0:
+                        for z_n in other_by_idempotent.get(z_m.right_idempotent, ()):
+                            z = Module.TensorGenerator(out, (z_m.key, z_n.key),
+                                                       z_m.left_idempotent, z_n.right_idempotent)
+                            if z not in out.graph:
+                                continue
+                            closed.add(z)
+                            for w in out.graph.predecessors(z):
+                                if w in closed:
+                                    worklist[(w, z)] = None
+                            for v in out.graph.successors(z):
+                                if v in closed:
+                                    worklist[(z, v)] = None
+                cancellations = out.cancel_reducible_edges(worklist, closed)
+                if stats is not None:
+                    stats.cancellations += cancellations
+                    stats.peak_edges = max(stats.peak_edges, out.graph.number_of_edges())
 
         return out
 
     # returns [(right, target, coefficient)]
     #   representing the delta_n paths starting at source outputting left
-    def delta_n(self, left, source) -> List[Tuple[TensorAlgebra.Generator, Module.TensorGenerator, Z2Polynomial]]:
-        if left.num_factors() == 0:
-            return [(self.right_tensor_algebra.one_generator(), source, self.ring.one())]
+    # memo - {(factors, source): paths}, can be shared between calls as long as this module does not change
+    # out_edges_by_left - {source: {left factor: [(target, right, coefficient)]}}, shared in the same way
+    def delta_n(self, left, source, memo: Dict = None, out_edges_by_left: Dict = None) \
+            -> List[Tuple[TensorAlgebra.Generator, Module.TensorGenerator, Z2Polynomial]]:
+        if memo is None:
+            memo = {}
+        if out_edges_by_left is None:
+            out_edges_by_left = {}
+        return self.delta_n_of_factors(tuple(left.factors), source, memo, out_edges_by_left)
+
+    # delta_n, with left given by its tuple of factors
+    def delta_n_of_factors(self, factors: Tuple, source, memo: Dict, out_edges_by_left: Dict) \
+            -> List[Tuple[TensorAlgebra.Generator, Module.TensorGenerator, Z2Polynomial]]:
+        key = (factors, source)
+        if key in memo:
+            return memo[key]
+
+        if len(factors) == 0:
+            out = [(self.right_tensor_algebra.one_generator(), source, self.ring.one())]
         else:
+            if source not in out_edges_by_left:
+                edges = {}
+                for new_source, k, c in self.graph.out_edge_items(source):
+                    edges.setdefault(k[0].to_algebra(), []).append((new_source, k[1], c))
+                out_edges_by_left[source] = edges
             out = []
-            for _, new_source, k, d in self.graph.out_edges(source, keys=True, data=True):
-                if k[0].to_algebra() != left.factors[0]:
-                    continue
-                right = k[1]
-                c = d['c']
+            for new_source, right, c in out_edges_by_left[source].get(factors[0], ()):
                 out += [(right ** more_right, target, more_c * c)
                         for more_right, target, more_c in
-                        self.delta_n(TensorAlgebra.Generator(self.left_tensor_algebra, left.factors[1:]), new_source)]
-            return out
+                        self.delta_n_of_factors(factors[1:], new_source, memo, out_edges_by_left)]
+
+        memo[key] = out
+        return out
+
+
+# counts the work done by TypeDA.tensor
+class TensorStats:
+    def __init__(self):
+        self.pairs_visited = 0
+        self.pairs_skipped = 0
+        # only counted when reducing while tensoring
+        self.cancellations = 0
+        self.peak_edges = 0
+
+    def __repr__(self) -> str:
+        return f"{self.pairs_visited} pairs of generators visited, {self.pairs_skipped} skipped, " \
+               f"{self.cancellations} cancellations (peak {self.peak_edges} edges)"
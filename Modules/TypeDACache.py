@@ -0,0 +1,107 @@
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from typing import Optional
+
+from Tangles.Tangle import ETangle
+
+# bump this whenever the records format or the way type DA structures are computed changes,
+# so that old entries are ignored instead of read back wrong
+FORMAT_VERSION = 2
+MAGIC = b'TFDA'
+
+
+# an on-disk cache of the type DA structures of elementary tangles, shared between processes and runs
+# entries are stored as Module.to_records(), under the hash of (etype, signs, position, r, reduced[, 'hat'])
+class TypeDACache:
+    # directory - where the entries live; defaults to $TANGLEFLOER_CACHE, then ~/.cache/tanglefloer
+    # max_bytes - once the entries take up more than this, the least recently used ones are removed
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1 << 30):
+        if directory is None:
+            directory = os.environ.get('TANGLEFLOER_CACHE',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'tanglefloer'))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(etangle: ETangle, r: int, reduced: bool):
+        key = etangle.etype.name, etangle.signs[1:], etangle.position, r, reduced
+        # hat flavor entries are kept apart, without changing the keys of existing entries
+        return key + ('hat',) if etangle.hat else key
+
+    def path(self, key) -> str:
+        digest = hashlib.sha256(repr((FORMAT_VERSION, key)).encode()).hexdigest()
+        return os.path.join(self.directory, digest + '.da')
+
+    # the records stored for this elementary tangle, or None if there are none
+    def get(self, etangle: ETangle, r: int, reduced: bool):
+        key = TypeDACache.key(etangle, r, reduced)
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if data[:len(MAGIC)] != MAGIC \
+                or int.from_bytes(data[len(MAGIC):len(MAGIC) + 2], 'big') != FORMAT_VERSION:
+            return None
+        try:
+            stored_key, records = pickle.loads(zlib.decompress(data[len(MAGIC) + 2:]))
+        except (zlib.error, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if stored_key != key:
+            return None
+        # reading an entry counts as using it
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def put(self, etangle: ETangle, r: int, reduced: bool, records) -> None:
+        key = TypeDACache.key(etangle, r, reduced)
+        data = MAGIC + FORMAT_VERSION.to_bytes(2, 'big') + zlib.compress(pickle.dumps((key, records)))
+        # write to a temporary file first, so that other processes never see half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    # removes the least recently used entries until the cache fits in max_bytes
+    def evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.da'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries += [(stat.st_mtime, stat.st_size, name)]
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def size(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory) if name.endswith('.da'))
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith('.da'):
+                os.unlink(os.path.join(self.directory, name))
@@ -1,8 +1,7 @@
 from __future__ import annotations
 
-from networkx import MultiDiGraph
-
 from Modules.Module import Module
+from Modules.ModuleGraph import ModuleGraph
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
 
@@ -11,7 +10,7 @@ from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
 class TypeDD(Module):
     def __init__(self, ring: Z2PolynomialRing, left_algebra: AMinus, right_algebra: AMinus,
                  left_scalar_action: Z2PolynomialRing.Map, right_scalar_action: Z2PolynomialRing.Map,
-                 graph: MultiDiGraph = None):
+                 graph: ModuleGraph = None):
         super().__init__(ring, left_algebra, right_algebra, left_scalar_action, right_scalar_action, graph)
 
     @staticmethod
@@ -36,23 +35,29 @@ class TypeDD(Module):
                and c == c.ring.one()
 
     def reduce_edge(self, x, y, k, d) -> None:
-        in_edges = list(self.graph.in_edges(y, keys=True, data=True))
-        out_edges = list(self.graph.out_edges(x, keys=True, data=True))
+        in_edges = self.graph.in_edge_items(y)
+        out_edges = self.graph.out_edge_items(x)
 
         self.graph.remove_nodes_from([x, y])
 
         left = k[0]
         right = k[1]
 
-        for w, _, (left_wy, right_wy), d_wy in in_edges:
+        # {w: the sum of the zigzags starting at it}
+        outputs = {}
+        for w, (left_wy, right_wy), c_wy in in_edges:
             if w == x or w == y:
                 continue
-            c_wy = d_wy['c']
-            for _, z, (left_xz, right_xz), d_xz in out_edges:
+            # these products only depend on w, so compute them once for every z
+            left_wyx = left_wy.to_algebra() * left.to_algebra()
+            right_wyx = right_wy.to_algebra() * right.to_algebra()
+            for z, (left_xz, right_xz), c_xz in out_edges:
                 if z == x or z == y:
                     continue
-                c_xz = d_xz['c']
-                self.add_structure_map(w,
-                                       (left_wy.to_algebra() * left.to_algebra() * left_xz.to_algebra())
-                                       ** (c_wy * c_xz * z)
-                                       ** (right_wy.to_algebra() * right.to_algebra() * right_xz.to_algebra()))
+                if w not in outputs:
+                    outputs[w] = self.accumulator()
+                outputs[w] += (left_wyx * left_xz.to_algebra()) \
+                    ** (c_wy * c_xz * z) \
+                    ** (right_wyx * right_xz.to_algebra())
+        for w, output in outputs.items():
+            self.add_structure_map(w, output.freeze())
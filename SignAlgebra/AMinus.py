@@ -1,28 +1,49 @@
 from __future__ import annotations
-from typing import List
+from collections import OrderedDict
+from functools import partial
+from typing import List, Dict, Optional
 
+import numpy
 from frozendict import frozendict
-from multimethod import multimethod
 
-from Functions.Functions import injections, simplify_coefficients, invert_injection, dict_to_sorted_string
+from Functions.Functions import injections, simplify_coefficients, invert_injection, dict_to_sorted_string, sublists, \
+    Accumulator
 from Modules.StrandDiagram import StrandDiagram
-from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
+from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial, FIELD_WIDTH
 
 
 # represents the algebra A^-(P) for some sign sequence P
 class AMinus:
-    def __init__(self, sign_sequence):
+    # table_size - how many generator products to remember: None remembers all of them,
+    #              a positive number keeps only the most recently used products, and 0 remembers nothing
+    # hat - if True, work in the hat flavor, with every U set to 0 (see Z2PolynomialRing)
+    def __init__(self, sign_sequence, table_size: Optional[int] = None, hat: bool = False):
         # the sign sequence
         self.ss = tuple(sign_sequence) if sign_sequence[0] is None else (None,) + tuple(sign_sequence)
         # the list of positive indices, which are important for variable indices
         self.positives = (None,) + tuple([i for i, s in enumerate(self.ss) if s is not None and s > 0])
         # the polynomial ring acting on this algebra
-        self.ring = Z2PolynomialRing([f'U{p}' for p in range(1, len(self.positives))])
+        self.hat = hat
+        self.ring = Z2PolynomialRing([f'U{p}' for p in range(1, len(self.positives))], hat)
+        # the orange strands, which are the same in every strand diagram of this algebra
+        self.orange_strands = {orange: 3 * (orange - 1 / 2,) for orange in range(1, len(self.ss))}
+        self.orange_signs = {orange: self.ss[orange] for orange in range(1, len(self.ss))}
+        # {orange strand index: variable name}, for the positive orange strands
+        self.orange_variables = {orange: f'U{p}' for p, orange in enumerate(self.positives) if orange is not None}
+        # {(gen1, gen2): gen1 * gen2}
+        self.table_size = table_size
+        self.multiplication_table = OrderedDict()
+        # {gen: d(gen)}
+        self.differential_table = {}
 
     # the zero element in A^-(P)
     def zero(self) -> AMinus.Element:
         return AMinus.Element(self, {})
 
+    # for summing many elements of this algebra, see Accumulator
+    def accumulator(self) -> Accumulator:
+        return Accumulator(partial(AMinus.Element, self))
+
     # a convenient way to construct elements of A^-(P)
     def generator(self, strands) -> AMinus.Generator:
         return AMinus.Generator(self, strands)
@@ -40,8 +61,109 @@ class AMinus:
     def idempotent(self, points) -> AMinus.Generator:
         return AMinus.Generator(self, {p: p for p in points})
 
+    # returns all generators of this algebra
+    def generators(self) -> List[AMinus.Generator]:
+        return [gen for points in sublists(list(range(len(self.ss)))) for gen in self.left_gens(list(points))]
+
+    # turns {orange strand index: power} into the corresponding monomial in self.ring
+    # negative orange strands do not contribute
+    def orange_powers_to_coefficient(self, powers: Dict) -> Z2Polynomial:
+        return self.ring.monomial(self.ring.pack({self.orange_variables[orange]: power
+                                                  for orange, power in powers.items()
+                                                  if orange in self.orange_variables}))
+
+    # the product of two generators, looked up in the multiplication table if possible
+    def multiply_generators(self, gen1: AMinus.Generator, gen2: AMinus.Generator) -> AMinus.Element:
+        if self.table_size == 0:
+            return gen1.compute_product(gen2)
+        key = (gen1, gen2)
+        product = self.multiplication_table.get(key)
+        if product is None:
+            product = gen1.compute_product(gen2)
+            self.multiplication_table[key] = product
+            if self.table_size is not None and len(self.multiplication_table) > self.table_size:
+                self.multiplication_table.popitem(last=False)
+        elif self.table_size is not None:
+            self.multiplication_table.move_to_end(key)
+        return product
+
+    # fills in the multiplication table for every pair of composable generators
+    def precompute_multiplication_table(self) -> None:
+        gens_by_left_idempotent = {}
+        for gen in self.generators():
+            gens_by_left_idempotent.setdefault(frozenset(gen.strands.keys()), []).append(gen)
+        for gen1 in self.generators():
+            for gen2 in gens_by_left_idempotent[frozenset(gen1.strands.values())]:
+                self.multiply_generators(gen1, gen2)
+
+    # the differential of a generator, looked up in the differential table if possible
+    def differential(self, gen: AMinus.Generator) -> AMinus.Element:
+        out = self.differential_table.get(gen)
+        if out is None:
+            out = gen.compute_diff()
+            self.differential_table[gen] = out
+        return out
+
+    # fills in the differential table for every generator
+    def precompute_differentials(self) -> None:
+        for gen in self.generators():
+            self.differential(gen)
+
+    # checks that d^2 = 0 at once on every generator in the differential table, filling it in first if it is empty
+    # the table becomes a list of entries (source, target, monomial), one for every term of every coefficient; d^2
+    # pairs each entry with every entry starting where it ends, and vanishes exactly when every (source, target,
+    # product of monomials) comes up an even number of times. packed monomials are split into 64-bit words of four
+    # exponents each, which multiply by adding without carrying from one exponent into the next
+    def d_squared_is_zero(self) -> bool:
+        if not self.differential_table:
+            self.precompute_differentials()
+        # d of every generator d reaches is needed as well
+        missing = {gen1 for d in self.differential_table.values() for gen1 in d.coefficients} \
+            - self.differential_table.keys()
+        while missing:
+            for gen in missing:
+                self.differential(gen)
+            missing = {gen1 for gen in missing for gen1 in self.differential_table[gen].coefficients} \
+                - self.differential_table.keys()
+        index = {gen: i for i, gen in enumerate(self.differential_table)}
+        entries = [(i, index[gen1], term)
+                   for gen, i in index.items()
+                   for gen1, c in self.differential_table[gen].coefficients.items()
+                   for term in c.terms]
+        if not entries:
+            return True
+        num_words = max(1, -(-len(self.ring.variable_list) * FIELD_WIDTH // 64))
+        words = {}
+        for _, _, term in entries:
+            if term not in words:
+                words[term] = [(term >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(num_words)]
+        sources = numpy.fromiter((entry[0] for entry in entries), dtype=numpy.uint64, count=len(entries))
+        targets = numpy.fromiter((entry[1] for entry in entries), dtype=numpy.uint64, count=len(entries))
+        monomials = numpy.array([words[entry[2]] for entry in entries], dtype=numpy.uint64)
+
+        # pair every entry with each entry whose source is its target
+        order = numpy.argsort(sources, kind='stable')
+        starts = numpy.searchsorted(sources[order], targets, 'left')
+        counts = numpy.searchsorted(sources[order], targets, 'right') - starts
+        first = numpy.repeat(numpy.arange(len(sources)), counts)
+        offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        second = order[numpy.repeat(starts, counts) + offsets]
+
+        terms = numpy.column_stack([sources[first], targets[second], monomials[first] + monomials[second]])
+        if len(terms) == 0:
+            return True
+        _, multiplicities = numpy.unique(terms, axis=0, return_counts=True)
+        return bool(numpy.all(multiplicities % 2 == 0))
+
+    # the multiplication and differential tables are caches, so they are not worth sending to other processes
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['multiplication_table'] = OrderedDict()
+        state['differential_table'] = {}
+        return state
+
     def __eq__(self, other: AMinus) -> bool:
-        return self.ss == other.ss
+        return self.ss == other.ss and self.hat == other.hat
 
     def __hash__(self):
         return hash(self.ss)
@@ -54,8 +176,9 @@ class AMinus:
             self.coefficients = frozendict(simplify_coefficients(coefficients))
 
         # addition
-        @multimethod
-        def __add__(self, other: AMinus.Element):
+        def __add__(self, other):
+            if not isinstance(other, AMinus.Element):
+                return other.__radd__(self)
             out_coefficients = {}
             for gen in self.coefficients.keys() - other.coefficients.keys():
                 out_coefficients[gen] = self.coefficients[gen]
@@ -65,38 +188,33 @@ class AMinus:
                 out_coefficients[gen] = other.coefficients[gen]
             return AMinus.Element(self.algebra, out_coefficients)
 
-        @multimethod
-        def __add__(self, other):
-            return other.__radd__(self)
-
         # the algebra multiplication
-        @multimethod
-        def __mul__(self, other: AMinus.Element) -> AMinus.Element:
-            out = self.algebra.zero()
+        def __mul__(self, other) -> AMinus.Element:
+            if isinstance(other, AMinus.Generator):
+                other = other.to_element()
+            elif not isinstance(other, AMinus.Element):
+                raise NotImplementedError()
+            out = self.algebra.accumulator()
             for (gen1, coefficient1) in self.coefficients.items():
                 for (gen2, coefficient2) in other.coefficients.items():
                     out += (coefficient1 * coefficient2) * (gen1 * gen2)
 
-            return out
-
-        @multimethod
-        def __mul__(self, other: AMinus.Generator) -> AMinus.Element:
-            return self * other.to_element()
+            return out.freeze()
 
         # the scalar multiplication
         def __rmul__(self, other: Z2Polynomial) -> AMinus.Element:
-            out = self.algebra.zero()
+            out = self.algebra.accumulator()
             for (gen, coefficient) in self.coefficients.items():
-                out += (other * coefficient) * gen
-            return out
+                out.add_term(gen, other * coefficient)
+            return out.freeze()
 
         # the differential operation
         def diff(self) -> AMinus.Element:
             # sum the differentials of all the strand diagrams
-            out = self.algebra.zero()
+            out = self.algebra.accumulator()
             for gen, coefficient in self.coefficients.items():
                 out += coefficient * gen.diff()
-            return out
+            return out.freeze()
 
         # twice the Alexander grading of this element
         def two_alexander(self):
@@ -120,13 +238,12 @@ class AMinus:
         def is_idempotent(self):
             return self == self * self
 
-        @multimethod
-        def __eq__(self, other: AMinus.Element):
-            return self.algebra == other.algebra and self.coefficients == other.coefficients
-
-        @multimethod
-        def __eq__(self, other: AMinus.Generator):
-            return self == other.to_element()
+        def __eq__(self, other):
+            if isinstance(other, AMinus.Element):
+                return self.algebra == other.algebra and self.coefficients == other.coefficients
+            if isinstance(other, AMinus.Generator):
+                return self == other.to_element()
+            return NotImplemented
 
         def __hash__(self):
             return hash((self.algebra, frozendict(self.coefficients)))
@@ -141,6 +258,7 @@ class AMinus:
         def __init__(self, algebra, strands):
             self.algebra = algebra
             self.strands = frozendict(strands)
+            self._hash = None
 
         def is_idempotent(self) -> bool:
             return self.to_element().is_idempotent()
@@ -163,28 +281,30 @@ class AMinus:
             return other + self.to_element()
 
         # the algebra multiplication
-        @multimethod
-        def __mul__(self, other: AMinus.Generator) -> AMinus.Element:
+        def __mul__(self, other) -> AMinus.Element:
+            if isinstance(other, AMinus.Element):
+                return self.to_element() * other
+            # we don't know how to multiply generators by anything else
+            if not isinstance(other, AMinus.Generator):
+                raise NotImplementedError()
+            return self.algebra.multiply_generators(self, other)
+
+        # the algebra multiplication, bypassing the multiplication table
+        def compute_product(self, other: AMinus.Generator) -> AMinus.Element:
             strands1 = self.strands
             strands2 = other.strands
             # check if the ends don't match
             if set(strands1.values()) != strands2.keys():
                 return self.algebra.zero()
 
-            orange_strands = {orange: 3 * (orange - 1 / 2,) for orange in range(1, len(self.algebra.ss))}
-            orange_signs = {orange: self.algebra.ss[orange] for orange in range(1, len(self.algebra.ss))}
             black_strands = {self.strands[black]: (black, self.strands[black], other.strands[self.strands[black]])
                              for black in self.strands.keys()}
 
-            sd = StrandDiagram(orange_strands, orange_signs, black_strands)
+            sd = StrandDiagram(self.algebra.orange_strands, self.algebra.orange_signs, black_strands)
             powers = sd.figure_6_relations()
             if powers is None:
                 return self.algebra.zero()
-            c = self.algebra.ring.one()
-            for orange, power in powers.items():
-                if orange in self.algebra.positives:
-                    p = self.algebra.positives.index(orange)
-                    c *= self.algebra.ring['U' + str(p)] ** power
+            c = self.algebra.orange_powers_to_coefficient(powers)
 
             # construct the new generator
             strands = {}
@@ -193,46 +313,30 @@ class AMinus:
 
             return c * AMinus.Generator(self.algebra, strands)
 
-        @multimethod
-        def __mul__(self, other: AMinus.Element) -> AMinus.Element:
-            return self.to_element() * other
-
-        @multimethod
-        def __mul__(self, other):
-            raise NotImplementedError()
-
-        # we don't know how to multiply generators by anything else
-        @multimethod
-        def __mul__(self, other):
-            raise NotImplementedError()
-
         # scalar multiplication
-        @multimethod
-        def __rmul__(self, other: Z2Polynomial) -> AMinus.Element:
-            return AMinus.Element(self.algebra, {self: other})
-
-        @multimethod
-        def __rmul__(self, other: AMinus.Element) -> AMinus.Element:
-            return other * self.to_element()
-
-        @multimethod
-        def __rmul__(self, other):
+        def __rmul__(self, other) -> AMinus.Element:
+            if isinstance(other, Z2Polynomial):
+                return AMinus.Element(self.algebra, {self: other})
+            if isinstance(other, AMinus.Element):
+                return other * self.to_element()
             raise NotImplementedError()
 
         # the differential
         def diff(self) -> AMinus.Element:
+            return self.algebra.differential(self)
+
+        # the differential, bypassing the differential table
+        def compute_diff(self) -> AMinus.Element:
             # find all strands that cross, and resolve them
-            out = self.algebra.zero()
+            out = self.algebra.accumulator()
             for s1, t1 in self.strands.items():
                 for s2, t2 in self.strands.items():
                     if s1 < s2 and t1 > t2:
                         out += self.smooth_crossing(s1, s2)
-            return out
+            return out.freeze()
 
         # computes a single summand of the differential
         def smooth_crossing(self, i, j) -> AMinus.Element:
-            orange_strands = {orange: 3 * (orange - 1 / 2,) for orange in range(1, len(self.algebra.ss))}
-            orange_signs = {orange: self.algebra.ss[orange] for orange in range(1, len(self.algebra.ss))}
             black_strands = {}
 
             for black in self.strands.keys():
@@ -243,15 +347,11 @@ class AMinus:
                 else:
                     black_strands[black] = (black, black, self.strands[black])
 
-            sd = StrandDiagram(orange_strands, orange_signs, black_strands)
+            sd = StrandDiagram(self.algebra.orange_strands, self.algebra.orange_signs, black_strands)
             powers = sd.figure_6_relations()
-            c = self.algebra.ring.one()
             if powers is None:
                 return self.algebra.zero()
-            for orange, power in powers.items():
-                if orange in self.algebra.positives:
-                    p = self.algebra.positives.index(orange)
-                    c *= self.algebra.ring['U' + str(p)] ** power
+            c = self.algebra.orange_powers_to_coefficient(powers)
 
             # construct the new generator
             new_strands = dict(self.strands)
@@ -292,16 +392,17 @@ class AMinus:
 
             return out
 
-        @multimethod
-        def __eq__(self, other: AMinus.Generator):
-            return self.algebra == other.algebra and self.strands == other.strands
-
-        @multimethod
-        def __eq__(self, other: AMinus.Element):
-            return self.to_element() == other
+        def __eq__(self, other):
+            if isinstance(other, AMinus.Generator):
+                return self.algebra == other.algebra and self.strands == other.strands
+            if isinstance(other, AMinus.Element):
+                return self.to_element() == other
+            return NotImplemented
 
         def __hash__(self):
-            return hash((self.algebra, self.strands))
+            if self._hash is None:
+                self._hash = hash((self.algebra, self.strands))
+            return self._hash
 
         def __repr__(self):
             return dict_to_sorted_string(self.strands)
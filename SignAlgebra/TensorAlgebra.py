@@ -1,10 +1,10 @@
 from __future__ import annotations
+from functools import partial
 from typing import Tuple
 
 from frozendict import frozendict
-from multimethod import multimethod
 
-from Functions.Functions import simplify_coefficients
+from Functions.Functions import simplify_coefficients, Accumulator
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.Z2PolynomialRing import Z2Polynomial
 
@@ -16,6 +16,10 @@ class TensorAlgebra:
     def zero(self):
         return TensorAlgebra.Element(self, {})
 
+    # for summing many elements of this tensor algebra, see Accumulator
+    def accumulator(self) -> Accumulator:
+        return Accumulator(partial(TensorAlgebra.Element, self))
+
     def one_generator(self):
         return TensorAlgebra.Generator(self, tuple())
 
@@ -37,8 +41,9 @@ class TensorAlgebra:
             return AMinus.Element(self.tensor_algebra.algebra,
                                   {g.to_algebra(): c for g, c in self.coefficients.items()})
 
-        @multimethod
-        def __add__(self, other: TensorAlgebra.Element) -> TensorAlgebra.Element:
+        def __add__(self, other) -> TensorAlgebra.Element:
+            if isinstance(other, TensorAlgebra.Generator):
+                other = other.to_element()
             new_coefficients = dict(self.coefficients)
             for g in other.coefficients:
                 if g in self.coefficients:
@@ -47,10 +52,6 @@ class TensorAlgebra:
                     new_coefficients[g] = other.coefficients[g]
             return TensorAlgebra.Element(self.tensor_algebra, new_coefficients)
 
-        @multimethod
-        def __add__(self, other: TensorAlgebra.Generator) -> TensorAlgebra.Element:
-            return self + other.to_element()
-
         # scalar multiplication
         def __rmul__(self, other: Z2Polynomial) -> TensorAlgebra.Element:
             assert other.ring == self.tensor_algebra.algebra.ring
@@ -60,9 +61,12 @@ class TensorAlgebra:
             return TensorAlgebra.Element(self.tensor_algebra, new_coefficients)
 
         # the tensor product A^(x)i (x) A -> A^(x)i+1
-        @multimethod
-        def __pow__(self, other: AMinus.Element) -> TensorAlgebra.Element:
-            out = self.tensor_algebra.zero()
+        def __pow__(self, other) -> TensorAlgebra.Element:
+            if isinstance(other, AMinus.Generator):
+                other = other.to_element()
+            elif not isinstance(other, AMinus.Element):
+                return other.__rpow__(self)
+            out = self.tensor_algebra.accumulator()
 
             for g1, c1 in self.coefficients.items():
                 for g2, c2 in other.coefficients.items():
@@ -70,24 +74,15 @@ class TensorAlgebra:
                             or g1.right_idempotent() == g2.left_idempotent():
                         out += (c1 * c2) * (g1 ** g2)
 
-            return out
-
-        @multimethod
-        def __pow__(self, other: AMinus.Generator) -> TensorAlgebra.Element:
-            return self ** other.to_element()
-
-        @multimethod
-        def __pow__(self, other):
-            return other.__rpow__(self)
-
-        @multimethod
-        def __rpow__(self, other: AMinus.Generator) -> TensorAlgebra.Element:
-            return other.to_element() ** self
+            return out.freeze()
 
         # the tensor product A (x) A^(x)i -> A^(x)i+1
-        @multimethod
-        def __rpow__(self, other: AMinus.Element) -> TensorAlgebra.Element:
-            out = self.tensor_algebra.zero()
+        def __rpow__(self, other) -> TensorAlgebra.Element:
+            if isinstance(other, AMinus.Generator):
+                other = other.to_element()
+            elif not isinstance(other, AMinus.Element):
+                return NotImplemented
+            out = self.tensor_algebra.accumulator()
 
             for g1, c1 in other.coefficients.items():
                 for g2, c2 in self.coefficients.items():
@@ -95,15 +90,14 @@ class TensorAlgebra:
                             or g1.right_idempotent() == g2.left_idempotent():
                         out += (c1 * c2) * (g1 ** g2)
 
-            return out
+            return out.freeze()
 
-        @multimethod
-        def __eq__(self, other: TensorAlgebra.Element) -> bool:
-            return self.tensor_algebra == other.tensor_algebra and self.coefficients == other.coefficients
-
-        @multimethod
-        def __eq__(self, other: TensorAlgebra.Generator) -> bool:
-            return self == other.to_element()
+        def __eq__(self, other) -> bool:
+            if isinstance(other, TensorAlgebra.Element):
+                return self.tensor_algebra == other.tensor_algebra and self.coefficients == other.coefficients
+            if isinstance(other, TensorAlgebra.Generator):
+                return self == other.to_element()
+            return NotImplemented
 
         def __hash__(self):
             return hash((self.tensor_algebra, self.coefficients))
@@ -115,6 +109,7 @@ class TensorAlgebra:
         def __init__(self, tensor_algebra, factors: Tuple):
             self.tensor_algebra = tensor_algebra
             self.factors = factors
+            self._hash = None
 
         def to_element(self) -> TensorAlgebra.Element:
             return TensorAlgebra.Element(self.tensor_algebra, {self: self.tensor_algebra.algebra.ring.one()})
@@ -146,39 +141,29 @@ class TensorAlgebra:
             return other * self.to_element()
 
         # tensor product
-        @multimethod
-        def __pow__(self, other: AMinus.Generator) -> TensorAlgebra.Generator:
-            assert self.right_idempotent() is None or other.left_idempotent() is None \
-                or self.right_idempotent() == other.left_idempotent()
-            return TensorAlgebra.Generator(self.tensor_algebra, self.factors + (other,))
-
-        # tensor product
-        @multimethod
-        def __pow__(self, other: AMinus.Element) -> TensorAlgebra.Element:
-            return self.to_element() ** other
-
-        @multimethod
-        def __pow__(self, other: TensorAlgebra.Generator) -> TensorAlgebra.Generator:
-            assert self.tensor_algebra == other.tensor_algebra
-            assert self.right_idempotent() is None or other.left_idempotent() is None \
-                or self.right_idempotent() == other.left_idempotent()
-            return TensorAlgebra.Generator(self.tensor_algebra, self.factors + other.factors)
-
-        @multimethod
         def __pow__(self, other):
+            if isinstance(other, AMinus.Generator):
+                assert self.right_idempotent() is None or other.left_idempotent() is None \
+                    or self.right_idempotent() == other.left_idempotent()
+                return TensorAlgebra.Generator(self.tensor_algebra, self.factors + (other,))
+            if isinstance(other, TensorAlgebra.Generator):
+                assert self.tensor_algebra == other.tensor_algebra
+                assert self.right_idempotent() is None or other.left_idempotent() is None \
+                    or self.right_idempotent() == other.left_idempotent()
+                return TensorAlgebra.Generator(self.tensor_algebra, self.factors + other.factors)
+            if isinstance(other, AMinus.Element):
+                return self.to_element() ** other
             return other.__rpow__(self)
 
         # tensor product
-        @multimethod
-        def __rpow__(self, other: AMinus.Generator) -> TensorAlgebra.Generator:
-            assert self.right_idempotent() is None or other.left_idempotent() is None \
+        def __rpow__(self, other):
+            if isinstance(other, AMinus.Generator):
+                assert self.right_idempotent() is None or other.left_idempotent() is None \
                     or self.right_idempotent() == other.left_idempotent()
-            return TensorAlgebra.Generator(self.tensor_algebra, (other,) + self.factors)
-
-        # tensor product
-        @multimethod
-        def __rpow__(self, other: AMinus.Element) -> TensorAlgebra.Element:
-            return other ** self.to_element()
+                return TensorAlgebra.Generator(self.tensor_algebra, (other,) + self.factors)
+            if isinstance(other, AMinus.Element):
+                return other ** self.to_element()
+            return NotImplemented
 
         def __str__(self):
             return str(self.factors)
@@ -186,13 +171,12 @@ class TensorAlgebra:
         def __repr__(self):
             return str(self.factors)
 
-        @multimethod
-        def __eq__(self, other: TensorAlgebra.Generator):
-            return self.tensor_algebra == other.tensor_algebra and self.factors == other.factors
-
-        @multimethod
         def __eq__(self, other):
+            if isinstance(other, TensorAlgebra.Generator):
+                return self.tensor_algebra == other.tensor_algebra and self.factors == other.factors
             return self.to_element() == other
 
         def __hash__(self):
-            return hash((self.tensor_algebra, self.factors))
+            if self._hash is None:
+                self._hash = hash((self.tensor_algebra, self.factors))
+            return self._hash
@@ -2,24 +2,85 @@ from __future__ import annotations
 from typing import Set, FrozenSet, Tuple, Dict, Iterable
 
 from frozendict import frozendict
-from multimethod import multimethod
 
 from Functions.Functions import is_injection, invert_injection
 
 
+# monomials are stored as packed integers: variable i occupies the bits [i*FIELD_WIDTH, (i+1)*FIELD_WIDTH).
+# the top bit of every field is a guard bit, so adding two valid monomials never carries into the next field,
+# and an exponent that grows too large shows up as a set guard bit
+FIELD_WIDTH = 16
+# the terms of the polynomial 1
+CONSTANT_TERMS = frozenset({0})
+
+
 class Z2PolynomialRing:
-    def __init__(self, variables: Iterable):
+    # hat - if True, every variable is set to 0 (the hat flavor), so that only constant terms survive and every
+    #       polynomial is 0 or 1
+    def __init__(self, variables: Iterable, hat: bool = False):
         self.variables = set(variables)
+        self.hat = hat
+        # a fixed order on the variables, which determines where each exponent lives in a packed monomial
+        self.variable_list = tuple(sorted(self.variables))
+        self.index = {var: i for i, var in enumerate(self.variable_list)}
+        self.field_mask = (1 << FIELD_WIDTH) - 1
+        self.max_exponent = (1 << (FIELD_WIDTH - 1)) - 1
+        self.guard_mask = sum(1 << (FIELD_WIDTH * (i + 1) - 1) for i in range(len(self.variable_list)))
+        self._zero = Z2Polynomial(self, frozenset())
+        self._one = Z2Polynomial(self, frozenset({0}))
+        self._generators = {}
 
     def zero(self) -> Z2Polynomial:
-        return Z2Polynomial(self, set())
+        return self._zero
 
     def one(self) -> Z2Polynomial:
-        return Z2Polynomial(self, {Z2Monomial(self, {})})
+        return self._one
 
     def __getitem__(self, item) -> Z2Polynomial:
-        assert item in self.variables
-        return Z2Monomial(self, {item: 1}).to_polynomial()
+        if item not in self._generators:
+            assert item in self.variables
+            self._generators[item] = Z2Polynomial(self, frozenset({self.pack({item: 1})}))
+        return self._generators[item]
+
+    # the polynomial with the given terms, or 0 if any variable appears with a positive power and this is a hat ring
+    def monomial(self, packed: int) -> Z2Polynomial:
+        if packed and self.hat:
+            return self._zero
+        return Z2Polynomial(self, frozenset({packed}))
+
+    # {variable: power} -> packed monomial
+    def pack(self, powers: Dict) -> int:
+        out = 0
+        for var, power in powers.items():
+            if power == 0:
+                continue
+            assert 0 < power <= self.max_exponent, f"exponent {power} of {var} does not fit in a packed monomial"
+            out |= power << (FIELD_WIDTH * self.index[var])
+        return out
+
+    # packed monomial -> {variable: power}, omitting variables with power 0
+    def unpack(self, monomial: int) -> Dict:
+        powers = {}
+        for i, var in enumerate(self.variable_list):
+            power = (monomial >> (FIELD_WIDTH * i)) & self.field_mask
+            if power:
+                powers[var] = power
+        return powers
+
+    # the total degree of a packed monomial
+    def monomial_degree(self, monomial: int) -> int:
+        out = 0
+        while monomial:
+            out += monomial & self.field_mask
+            monomial >>= FIELD_WIDTH
+        return out
+
+    # the product of two packed monomials
+    def multiply_monomials(self, m1: int, m2: int) -> int:
+        out = m1 + m2
+        if out & self.guard_mask:
+            raise OverflowError('exponent too large for a packed monomial')
+        return out
 
     # represents a map between polynomial rings that sends some variables to other variables
     # very limited in scope
@@ -32,6 +93,14 @@ class Z2PolynomialRing:
             self.target = target
             self.mapping = mapping
             self.retract = invert_injection(self.mapping) if is_injection(self.mapping) else None
+            # (source shift, target shift) for every mapped variable, so that packed monomials can be mapped
+            # field by field
+            self._shifts = tuple((FIELD_WIDTH * source.index[s], FIELD_WIDTH * target.index[t])
+                                 for s, t in mapping.items())
+            self._unmapped = tuple(v for v in source.variable_list if v not in mapping)
+            self._unmapped_mask = sum(source.field_mask << (FIELD_WIDTH * source.index[v]) for v in self._unmapped)
+            # {packed source monomial: packed target monomial}
+            self._monomial_images = {}
 
         @staticmethod
         def identity(source: Z2PolynomialRing, target: Z2PolynomialRing) -> Z2PolynomialRing.Map:
@@ -39,42 +108,44 @@ class Z2PolynomialRing:
 
             return Z2PolynomialRing.Map(source, target, {v: v for v in source.variables})
 
-        @multimethod
-        def apply(self, x: Z2Polynomial) -> Z2Polynomial:
+        def apply(self, x: Z2Polynomial | Z2Monomial) -> Z2Polynomial | Z2Monomial:
             assert x.ring == self.source
 
-            y = self.target.zero()
+            if isinstance(x, Z2Monomial):
+                return Z2Monomial.from_packed(self.target, self.apply_packed(x.packed))
 
+            terms = set()
             for x_term in x.terms:
-                y += self.apply(x_term).to_polynomial()
-
-            return y
-
-        @multimethod
-        def apply(self, x: Z2Monomial):
-            assert x.ring == self.source
-
-            powers = {}
-            for var, power in x.powers.items():
-                output_var = self.mapping[var]
-                if output_var in powers:
-                    powers[output_var] += power
-                else:
-                    powers[output_var] = power
-
-            return Z2Monomial(self.target, powers)
+                terms ^= {self.apply_packed(x_term)}
+
+            return Z2Polynomial(self.target, frozenset(terms))
+
+        # applies this map to a single packed monomial
+        def apply_packed(self, monomial: int) -> int:
+            image = self._monomial_images.get(monomial)
+            if image is None:
+                if monomial & self._unmapped_mask:
+                    raise KeyError(next(v for v in self._unmapped
+                                        if (monomial >> (FIELD_WIDTH * self.source.index[v])) & self.source.field_mask))
+                image = 0
+                field_mask = self.source.field_mask
+                for source_shift, target_shift in self._shifts:
+                    power = (monomial >> source_shift) & field_mask
+                    if power:
+                        image = self.target.multiply_monomials(image, power << target_shift)
+                self._monomial_images[monomial] = image
+            return image
 
         # applies f^{-1} to y if possible
         def retract(self, y: Z2Polynomial) -> Z2Polynomial:
             assert self.retract is not None and y.ring == self.target
 
-            x = self.target.zero()
-
+            terms = set()
             for y_term in y.terms:
-                x += Z2Monomial(self.source, {self.retract[var]: power
-                                              for var, power in y_term.powers.items()}).to_polynomial()
+                terms ^= {self.source.pack({self.retract[var]: power
+                                            for var, power in self.target.unpack(y_term).items()})}
 
-            return x
+            return Z2Polynomial(self.source, frozenset(terms))
 
         # returns the map x -> self.apply(other.apply(x))
         def compose(self, other: Z2PolynomialRing.Map) -> Z2PolynomialRing.Map:
@@ -90,7 +161,7 @@ class Z2PolynomialRing:
             right_vars = other.target.variables - set(other.mapping.values())
             pushout = Z2PolynomialRing([v + 'a' for v in left_vars] +
                                        [v + 'b' for v in common_vars] +
-                                       [v + 'c' for v in right_vars])
+                                       [v + 'c' for v in right_vars], self.target.hat or other.target.hat)
 
             in_left = Z2PolynomialRing.Map(self.target, pushout,
                                            {**{v: v + 'a' for v in left_vars},
@@ -102,24 +173,31 @@ class Z2PolynomialRing:
             return in_left, in_right
 
 
-# knows addition
-# passes multiplication and equality off to Z2Monomial x Z2Monomial
+# knows addition and multiplication
+# terms is a frozenset of packed monomials (see Z2PolynomialRing.pack)
 class Z2Polynomial:
-    @multimethod
-    def __init__(self, ring: Z2PolynomialRing, terms: FrozenSet):
-        self.ring = ring
-        self.terms = terms
-
-    @multimethod
-    def __init__(self, ring: Z2PolynomialRing, terms: Set):
+    def __init__(self, ring: Z2PolynomialRing, terms: Set | FrozenSet):
         self.ring = ring
         self.terms = frozenset(terms)
+        # in a hat ring every variable is 0, so drop the terms that have any
+        if ring.hat and self.terms and self.terms != CONSTANT_TERMS:
+            self.terms = self.terms & CONSTANT_TERMS
+
+    # the terms of this polynomial as Z2Monomial objects
+    def monomials(self) -> Set[Z2Monomial]:
+        return {Z2Monomial.from_packed(self.ring, term) for term in self.terms}
+
+    def is_zero(self) -> bool:
+        return not self.terms
+
+    def is_one(self) -> bool:
+        return self.terms == self.ring.one().terms
 
     def degree(self) -> int:
         if len(self.terms) == 0:
             return 0
         else:
-            degrees = {term.degree() for term in self.terms}
+            degrees = {self.ring.monomial_degree(term) for term in self.terms}
             if len(degrees) > 1:
                 raise Exception('non-homogeneous polynomial')
             else:
@@ -130,74 +208,92 @@ class Z2Polynomial:
 
         return Z2Polynomial(self.ring, self.terms ^ other.terms)
 
-    @multimethod
     def __mul__(self, other):
-        return other.__rmul__(self)
-
-    @multimethod
-    def __mul__(self, other: Z2Polynomial) -> Z2Polynomial:
+        if not isinstance(other, Z2Polynomial):
+            return other.__rmul__(self)
         assert self.ring == other.ring
 
-        out = self.ring.zero()
-
+        terms = set()
+        guard_mask = self.ring.guard_mask
         for term1 in self.terms:
             for term2 in other.terms:
-                out += (term1 * term2).to_polynomial()
+                term = term1 + term2
+                if term & guard_mask:
+                    raise OverflowError('exponent too large for a packed monomial')
+                if term in terms:
+                    terms.remove(term)
+                else:
+                    terms.add(term)
 
-        return out
+        return Z2Polynomial(self.ring, frozenset(terms))
 
     def __pow__(self, power: int) -> Z2Polynomial:
+        # a monomial to a power only needs its exponents scaled
+        if len(self.terms) == 1:
+            (term,) = self.terms
+            if power == 0:
+                return self.ring.one()
+            if max(self.ring.unpack(term).values(), default=0) * power > self.ring.max_exponent:
+                raise OverflowError('exponent too large for a packed monomial')
+            return Z2Polynomial(self.ring, frozenset({term * power}))
         out = self.ring.one()
         for _ in range(power):
             out *= self
         return out
 
-    @multimethod
-    def __eq__(self, other: Z2Polynomial) -> bool:
-        return self.terms == other.terms
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Z2Polynomial):
+            return NotImplemented
+        return self.ring == other.ring and self.terms == other.terms
 
     def __hash__(self):
-        return hash(self.terms)
+        return hash(self.ring) + hash(self.terms)
 
     def __repr__(self) -> str:
         out = ''
-        for term in self.terms:
+        for term in self.monomials():
             out += str(term) + ' + '
         return out[:-3] or str(0)
 
 
+# a single monomial, wrapping its packed form
 # knows multiplication, equality
 # passes adding back to Z2Polynomial
 class Z2Monomial:
     def __init__(self, ring, powers: Dict):
         self.ring = ring
-        self.powers = frozendict(powers)
+        self.packed = ring.pack(powers)
+
+    @staticmethod
+    def from_packed(ring: Z2PolynomialRing, packed: int) -> Z2Monomial:
+        out = Z2Monomial.__new__(Z2Monomial)
+        out.ring = ring
+        out.packed = packed
+        return out
+
+    # {variable: power}, omitting variables with power 0
+    @property
+    def powers(self) -> frozendict:
+        return frozendict(self.ring.unpack(self.packed))
 
     def degree(self) -> int:
-        return sum(self.powers.values())
+        return self.ring.monomial_degree(self.packed)
 
     def to_polynomial(self) -> Z2Polynomial:
-        return Z2Polynomial(self.ring, {self})
+        return Z2Polynomial(self.ring, frozenset({self.packed}))
 
-    @multimethod
     def __mul__(self, other):
-        return other.__rmul__(self)
-
-    @multimethod
-    def __mul__(self, other: Z2Monomial) -> Z2Monomial:
-        return Z2Monomial(self.ring, {var: self.powers.get(var, 0) + other.powers.get(var, 0)
-                                      for var in self.powers.keys() | other.powers.keys()})
-
-    @multimethod
-    def __eq__(self, other: Z2Monomial) -> bool:
-        return self.ring == other.ring and self.powers == other.powers
+        if not isinstance(other, Z2Monomial):
+            return other.__rmul__(self)
+        return Z2Monomial.from_packed(self.ring, self.ring.multiply_monomials(self.packed, other.packed))
 
-    @multimethod
     def __eq__(self, other) -> bool:
+        if isinstance(other, Z2Monomial):
+            return self.ring == other.ring and self.packed == other.packed
         return self.to_polynomial() == other
 
     def __hash__(self):
-        return hash(self.ring) + hash(self.powers)
+        return hash(self.ring) + hash(self.packed)
 
     def __repr__(self) -> str:
         out = ''
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from enum import auto, Enum
-from typing import Optional, List, Tuple
+from functools import cached_property
+from typing import Optional, List, Tuple, Dict
 
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Polynomial
@@ -14,12 +15,14 @@ class Tangle:
         for i in range(len(etangles) - 1):
             assert etangles[i].right_sign_sequence() == etangles[i + 1].left_sign_sequence(), \
                 "Signs do not match at index {}".format(i)
+            assert etangles[i].hat == etangles[i + 1].hat, "Flavors do not match at index {}".format(i)
 
         self.etangles = tuple(etangles)
 
         self.height = max(len(etangle.signs) for etangle in etangles)
-        self.left_algebra = AMinus(self.left_sign_sequence())
-        self.right_algebra = AMinus(self.right_sign_sequence())
+        self.hat = etangles[0].hat
+        self.left_algebra = AMinus(self.left_sign_sequence(), hat=self.hat)
+        self.right_algebra = AMinus(self.right_sign_sequence(), hat=self.hat)
 
     def right_points(self) -> List:
         return self.etangles[-1].right_points()
@@ -65,9 +68,11 @@ class ETangle(Tangle):
     #         signs[0] is None to enforce 1-indexing
     # position - nat n, where the cup/cap/crossing is between strand indices n and n+1
     #           None if etype is STRAIGHT
+    # hat - if True, compute the hat flavor: every U is set to 0 in this tangle's ring and algebras, so that terms
+    #       with a U in them are dropped as soon as they come up
     # over/under represents what the bottom strand does; under on the left, over on the right
     # CONVENTION: strand indices are 1-indexed, starting from the bottom
-    def __init__(self, etype: ETangle.Type, signs, position=None):
+    def __init__(self, etype: ETangle.Type, signs, position=None, hat: bool = False):
 
         for sign in signs:
             assert sign in (-1, 1), "{} is not a valid sign.".format(sign)
@@ -80,12 +85,14 @@ class ETangle(Tangle):
         self.etype = etype
         self.signs = (None,) + signs
         self.position = position
+        self.hat = hat
 
         super().__init__((self,))
 
         self.ring = \
             Z2PolynomialRing(['U' + str(i)
-                              for i in range(1, len(self.middle_points()) + len(self.left_algebra.positives) - 1)])
+                              for i in range(1, len(self.middle_points()) + len(self.left_algebra.positives) - 1)],
+                             hat)
 
         self.left_scalar_action = self.build_left_scalar_action()
         self.right_scalar_action = self.build_right_scalar_action()
@@ -233,6 +240,32 @@ class ETangle(Tangle):
         else:
             raise Exception('unknown ETangle.Type')
 
+    # the orange strands, in the form StrandDiagram takes them: {strand index: (left, middle, right)}
+    # these only depend on the etangle, so they are built once and shared by every diagram drawn on it,
+    # and must not be modified
+    @cached_property
+    def orange_strands(self) -> Dict:
+        return {orange: (self.left_y_pos(orange), self.middle_y_pos(orange), self.right_y_pos(orange))
+                for orange in range(1, len(self.signs))}
+
+    # the left half of the orange strands, {strand index: (left, left, middle)}, for those that reach the left edge
+    # (left, middle, middle) breaks {0: 0, 1: 2} on a cup with (-1, 1)
+    @cached_property
+    def left_orange_strands(self) -> Dict:
+        return {orange: (self.left_y_pos(orange), self.left_y_pos(orange), self.middle_y_pos(orange))
+                for orange in range(1, len(self.signs)) if self.left_y_pos(orange)}
+
+    # the right half of the orange strands, {strand index: (middle, right, right)}, for those that reach the right edge
+    @cached_property
+    def right_orange_strands(self) -> Dict:
+        return {orange: (self.middle_y_pos(orange), self.right_y_pos(orange), self.right_y_pos(orange))
+                for orange in range(1, len(self.signs)) if self.right_y_pos(orange)}
+
+    # {strand index: sign} for every orange strand
+    @cached_property
+    def orange_signs(self) -> Dict:
+        return {orange: self.signs[orange] for orange in range(1, len(self.signs))}
+
     # does this strand stay straight on the left side of this tangle?
     def left_strand_straight(self, strand_index: int) -> bool:
         return self.left_y_pos(strand_index) == self.middle_y_pos(strand_index)
@@ -267,7 +300,8 @@ class ETangle(Tangle):
             other_etangle = other.etangles[0]
             return self.etype == other_etangle.etype \
                 and self.signs == other_etangle.signs \
-                and self.position == other_etangle.position
+                and self.position == other_etangle.position \
+                and self.hat == other_etangle.hat
         else:
             return False
 
@@ -0,0 +1,56 @@
+from Modules.ChainComplex import ChainComplex
+from Modules.Module import Module
+from SignAlgebra.AMinus import AMinus
+from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing
+
+
+def chain_complex(ring: Z2PolynomialRing, gradings):
+    algebra = AMinus((1,))
+    action = Z2PolynomialRing.Map(algebra.ring, ring, {})
+    cc = ChainComplex(ring, algebra, algebra, action, action)
+    gens = {}
+    for name, grading in gradings.items():
+        gens[name] = Module.TensorGenerator(cc, name, algebra.idempotent([0]), algebra.idempotent([0]))
+        cc.add_generator(gens[name], grading)
+    return cc, gens
+
+
+def test_homology_ranks():
+    r = Z2PolynomialRing(['U1'])
+    u1 = r['U1']
+    cc, g = chain_complex(r, {'a': (0, 0), 'b': (-1, 0), 'c': (0, 0), 'd': (1, 2), 'e': (3, 1)})
+    cc.add_structure_map(g['a'], r.one() * g['b'])
+    cc.add_structure_map(g['c'], u1 * g['d'])
+
+    assert cc.d_squared_is_zero()
+    assert cc.homology_ranks(0) == {(0, 0): 1, (1, 2): 1, (3, 1): 1}
+    assert cc.homology_ranks(1) == {1: 1}
+    assert cc.homology_rank(0) == 3
+    assert cc.homology_rank(1) == 1
+
+    generators, columns = cc.gf2_matrix(1)
+    assert bin(columns[generators.index(g['c'])]).count('1') == 1
+
+
+def test_d_squared():
+    r = Z2PolynomialRing(['U1'])
+    cc, g = chain_complex(r, {'a': (0, 0), 'b': (-1, 0), 'c': (-2, 0)})
+    cc.add_structure_map(g['a'], r.one() * g['b'])
+    cc.add_structure_map(g['b'], r.one() * g['c'])
+    assert not cc.d_squared_is_zero()
+
+
+def test_reduce():
+    r = Z2PolynomialRing(['U1'])
+    cc, g = chain_complex(r, {'w': (1, 0), 'x': (1, 0), 'y': (0, 0), 'z': (0, 0)})
+    cc.add_structure_map(g['w'], r.one() * g['y'] + r.one() * g['z'])
+    cc.add_structure_map(g['x'], r.one() * g['y'] + r.one() * g['z'])
+    ranks = cc.homology_ranks(0)
+
+    # cancelling x -> y adds the zigzag w -> y -> x -> z, which cancels the edge w -> z
+    edge = cc.graph.edges_between(g['x'], g['y'])
+    cc.reduce_edge(g['x'], g['y'], *list(edge.items())[0])
+    assert cc.graph.number_of_nodes() == 2
+    assert cc.graph.number_of_edges() == 0
+    assert cc.homology_ranks(0) == ranks
+    assert cc.d(g['w']) == cc.zero()
@@ -1,7 +1,19 @@
+import gc
+import pickle
+
+from Functions.Functions import process_pool, partial_bijections, injections
 from Modules.CTMinus import d_plus, m2, delta_ell, type_da, delta_ell_case_1, delta_ell_case_2, delta_ell_case_3, \
-    delta_ell_case_4, d_mixed, d_minus
+    delta_ell_case_4, d_mixed, d_minus, type_da_in_left_grading, reduced_type_da, \
+    reduced_type_da_in_right_grading, estimate_tensor_order_costs, enumerate_gens, iter_gens, count_gens, \
+    idempotent_counts, empty_type_da, reduced_type_da_in_left_grading, tensor_order_costs, \
+    piece_left_occupied_points, left_occupied_points, strands_label
 from Modules.ETangleStrands import ETangleStrands
-from Modules.TypeDA import TypeDA
+from Modules.JobPlan import generator_counts, type_da_idempotent_counts, reduced_type_da_idempotent_counts, \
+    estimate_type_da, estimate_reduced_type_da, piece_idempotent_counts
+from Modules.Module import Module, ReductionStats, REDUCTION_STRATEGIES
+from Modules.ModuleGraph import ModuleGraph
+from Modules.TypeDA import TypeDA, TensorStats
+from Modules.TypeDACache import TypeDACache
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Monomial
 from Tangles.Tangle import ETangle
@@ -233,6 +245,370 @@ def test_halve():
     unknot_da = unknot_da.halve()
     assert len(unknot_da.graph.nodes()) == 4
 
+
+def test_reduce_component():
+    over = ETangle(ETangle.Type.OVER, (-1, 1), 1)
+    for r in range(len(over.left_points()) + 1):
+        da = type_da_in_left_grading(over, r)
+        num_gens = len(da.graph.nodes)
+        da.reduce_component()
+        assert da.get_reducible_edge() is None
+        assert len(da.graph.nodes) < num_gens
+        assert (num_gens - len(da.graph.nodes)) % 2 == 0
+
+
+def test_reduction_strategies():
+    over = ETangle(ETangle.Type.OVER, (-1, 1), 1)
+    da = type_da_in_left_grading(over, 1)
+    num_edges = len(da.graph.edges)
+    for strategy in REDUCTION_STRATEGIES:
+        stats = ReductionStats(strategy)
+        reduced = da.copy().reduce_component(strategy, stats)
+        assert reduced.get_reducible_edge() is None
+        assert stats.initial_edges == num_edges
+        assert stats.edges == len(reduced.graph.edges)
+        assert stats.peak_edges >= max(stats.initial_edges, stats.edges)
+        assert stats.cancellations == (len(da.graph.nodes) - len(reduced.graph.nodes)) // 2
+    assert set(da.compare_reduction_strategies().keys()) == set(REDUCTION_STRATEGIES)
+
+    # 'degree' always cancels a reducible edge of the lowest degree left
+    m = da.copy()
+    reduce_edge = m.reduce_edge
+
+    def checked_reduce_edge(x, y, k, d):
+        degree = m.graph.in_degree(y) * m.graph.out_degree(x)
+        assert all(degree <= m.graph.in_degree(z) * m.graph.out_degree(w)
+                   for w, z in m.graph.edges() if m.reducible_edge_between(w, z) is not None)
+        reduce_edge(x, y, k, d)
+
+    m.reduce_edge = checked_reduce_edge
+    assert m.reduce_component('degree').get_reducible_edge() is None
+
+
+def test_parallel_type_da():
+    over = ETangle(ETangle.Type.OVER, (-1, 1), 1)
+    serial = type_da(over)
+    parallel = type_da(over, workers=2)
+    assert sorted(serial.to_records()[1]) == sorted(parallel.to_records()[1])
+    assert sorted(serial.to_records()[2]) == sorted(parallel.to_records()[2])
+    assert parallel.is_isomorphic_to(serial)
+
+    unknot = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    serial = reduced_type_da(unknot)
+    parallel = reduced_type_da(unknot, workers=2)
+    assert len(serial.graph.nodes) == len(parallel.graph.nodes)
+    assert {x.key for x in serial.graph.nodes} == {x.key for x in parallel.graph.nodes}
+
+
+def test_parallel_structure_maps():
+    over = ETangle(ETangle.Type.OVER, (-1, 1, -1), 1)
+    serial = type_da_in_left_grading(over, 1)
+    parallel = type_da_in_left_grading(over, 1, workers=2, chunk_size=16)
+    assert sorted(serial.to_records()[2]) == sorted(parallel.to_records()[2])
+
+    small_over = ETangle(ETangle.Type.OVER, (-1, 1), 1)
+    serial = type_da(small_over)
+    parallel = type_da(small_over, workers=2, chunk_size=2)
+    assert sorted(serial.to_records()[1]) == sorted(parallel.to_records()[1])
+    assert sorted(serial.to_records()[2]) == sorted(parallel.to_records()[2])
+
+    serial = reduced_type_da_in_left_grading(small_over, 1)
+    parallel = reduced_type_da_in_left_grading(small_over, 1, workers=2, chunk_size=2)
+    assert sorted(serial.to_records()[1]) == sorted(parallel.to_records()[1])
+
+    # one pool can serve several calls
+    with process_pool(2) as pool:
+        first = type_da_in_left_grading(small_over, 1, chunk_size=2, pool=pool)
+        second = reduced_type_da_in_left_grading(small_over, 1, chunk_size=2, pool=pool)
+    assert sorted(first.to_records()[2]) == sorted(type_da_in_left_grading(small_over, 1).to_records()[2])
+    assert sorted(second.to_records()[1]) == sorted(serial.to_records()[1])
+
+    unknot = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    serial = reduced_type_da_in_right_grading(unknot, 0)
+    parallel = reduced_type_da_in_right_grading(unknot, 0, workers=2, chunk_size=2)
+    assert sorted(serial.to_records()[1]) == sorted(parallel.to_records()[1])
+
+
+def test_type_da_cache(tmp_path):
+    cache = TypeDACache(str(tmp_path))
+    unknot = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    expected = reduced_type_da(unknot)
+    first = reduced_type_da(unknot, cache=cache)
+    assert cache.size() > 0
+    second = reduced_type_da(unknot, cache=cache)
+    for m in (first, second):
+        assert {x.key for x in m.graph.nodes} == {x.key for x in expected.graph.nodes}
+
+    cup = unknot.etangles[0]
+    assert cache.get(cup, 0, False) is None
+    assert cache.get(cup, 0, True) is not None
+
+    small = TypeDACache(str(tmp_path), max_bytes=0)
+    small.evict()
+    assert small.size() == 0
+
+
+def test_tensor_stats():
+    cup = ETangle(ETangle.Type.CUP, (1, -1), 1)
+    cap = ETangle(ETangle.Type.CAP, (1, -1), 1)
+    m = type_da(cup)
+    n = type_da(cap)
+    stats = TensorStats()
+    product = m.tensor(n, stats)
+    assert stats.pairs_visited == product.graph.number_of_nodes()
+    assert stats.pairs_visited + stats.pairs_skipped == m.graph.number_of_nodes() * n.graph.number_of_nodes()
+    assert product.to_records() == (m ** n).to_records()
+
+
+def test_delta_n_memo():
+    cap = type_da(ETangle(ETangle.Type.CAP, (1, -1), 1))
+    memo = {}
+    out_edges_by_left = {}
+    for x in cap.graph.nodes:
+        for _, _, (left, _), _ in cap.graph.in_edges(x, keys=True, data=True):
+            for source in cap.graph.nodes:
+                expected = cap.delta_n(left, source)
+                assert cap.delta_n(left, source, memo, out_edges_by_left) == expected
+                assert cap.delta_n(left, source, memo, out_edges_by_left) == expected
+
+
+def test_streaming_tensor():
+    over = ETangle(ETangle.Type.OVER, (1, -1), 1)
+    under = ETangle(ETangle.Type.UNDER, (1, -1), 1)
+    m = type_da_in_left_grading(over, 2).reduce_component()
+    n = type_da_in_left_grading(under, 2).reduce_component()
+    stats = TensorStats()
+    streamed = m.tensor(n, stats, reduce=True)
+    product = m ** n
+    reduced = product.copy().reduce()
+    assert stats.cancellations > 0
+    assert stats.peak_edges < product.graph.number_of_edges()
+    assert streamed.get_reducible_edge() is None
+    assert streamed.graph.number_of_nodes() == reduced.graph.number_of_nodes()
+
+    unknot = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    streamed = reduced_type_da(unknot)
+    reduced = reduced_type_da(unknot, streaming=False)
+    assert sorted(streamed.to_records()[1]) == sorted(reduced.to_records()[1])
+    assert sorted(streamed.to_records()[2]) == sorted(reduced.to_records()[2])
+
+
+def test_tensor_orders():
+    tangle = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.OVER, (1, -1), 1) \
+        + ETangle(ETangle.Type.UNDER, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    fold = reduced_type_da_in_right_grading(tangle, 0, order='fold')
+    for order, workers in [('tree', 1), ('tree', 2), ('auto', 1)]:
+        out = reduced_type_da_in_right_grading(tangle, 0, order=order, workers=workers)
+        assert out.graph.number_of_nodes() == fold.graph.number_of_nodes()
+        assert out.graph.number_of_edges() == fold.graph.number_of_edges()
+        assert out.get_reducible_edge() is None
+
+    pieces = [type_da_in_left_grading(ETangle(ETangle.Type.OVER, (1, -1), 1), 1),
+              type_da_in_left_grading(ETangle(ETangle.Type.UNDER, (1, -1), 1), 1)]
+    costs = estimate_tensor_order_costs(pieces)
+    assert costs['fold'] == costs['tree'] == (pieces[0] ** pieces[1]).graph.number_of_nodes()
+    assert tensor_order_costs([idempotent_counts(piece) for piece in pieces]) == costs
+
+    for i in range(len(tangle.right_points()) + 1):
+        rs = piece_left_occupied_points(tangle, i)
+        assert len(rs) == len(tangle.etangles)
+        assert rs[0] == left_occupied_points(tangle, i)
+
+
+def test_module_graph():
+    da = type_da(ETangle(ETangle.Type.OVER, (-1, 1), 1))
+    graph = da.graph
+    assert graph.number_of_edges() == len(graph.edge_items()) == sum(graph.out_degree(x) for x in graph.nodes)
+    exported = graph.to_networkx()
+    assert exported.number_of_nodes() == graph.number_of_nodes()
+    assert exported.number_of_edges() == graph.number_of_edges()
+    assert sorted(ModuleGraph.from_networkx(exported).edges(keys=True), key=str) == \
+        sorted(graph.edges(keys=True), key=str)
+
+    x, y, k, c = graph.edge_items()[0]
+    copy = graph.copy()
+    copy.add_coefficient(x, y, k, c)
+    assert copy.coefficient(x, y, k) is None
+    assert copy.number_of_edges() == graph.number_of_edges() - 1
+    assert graph.coefficient(x, y, k) == c
+
+    copy.add_edge(x, x, k, c)
+    edges = copy.number_of_edges()
+    removed = len({(w, v, key) for w, v, key in copy.in_edges(x, keys=True) + copy.out_edges(x, keys=True)})
+    copy.remove_node(x)
+    assert x not in copy
+    assert copy.number_of_edges() == edges - removed
+    assert sum(len(component) for component in copy.weakly_connected_components()) == copy.number_of_nodes()
+
+    # keys no edge has any more are dropped, and their ids reused
+    keys = {key for _, _, key, _ in copy.edge_items()}
+    for w in list(copy.nodes):
+        copy.remove_node(w)
+    assert copy.number_of_edges() == 0
+    assert not copy._key_ids and len(copy._free_key_ids) == len(copy._keys) >= len(keys)
+    copy.add_edge(x, y, k, c)
+    assert copy.coefficient(x, y, k) == c and copy._keys.count(k) == 1
+    copy.remove_edge(x, y, k)
+    assert not copy._key_ids
+
+
+def test_interned_generators():
+    etangle = ETangle(ETangle.Type.OVER, (-1, 1), 1)
+    da = type_da(etangle)
+    x = next(iter(da.graph.nodes))
+    same = Module.TensorGenerator(x.module, x.key, x.left_idempotent, x.right_idempotent)
+    assert same is x
+    assert x.get_module_generator() is x
+    other = Module.TensorGenerator(da, x.key, x.left_idempotent, x.right_idempotent)
+    assert (other == x) == (da is x.module)
+
+    a = etangle.right_algebra.left_gens(list(x.right_idempotent.strands.keys()))[0]
+    assert (x ** a).get_module_generator() is x
+    assert x ** a == x ** a and hash(x ** a) == hash(x ** a)
+    assert x ** a != x
+    assert pickle.loads(pickle.dumps(x.left_idempotent)) == x.left_idempotent
+
+    copy = pickle.loads(pickle.dumps(da))
+    assert copy.to_records() == da.to_records()
+    y = next(iter(copy.graph.nodes))
+    assert Module.TensorGenerator(y.module, y.key, y.left_idempotent, y.right_idempotent) is y
+    x_copy = pickle.loads(pickle.dumps(x))
+    assert x_copy.get_module_generator() is x_copy
+    assert x_copy.key == x.key and x_copy in x_copy.module.graph
+    assert pickle.loads(pickle.dumps(x ** a)).get_module_generator().key == x.key
+
+    # generators cancelled away are not kept alive by the table
+    m = type_da_in_left_grading(etangle, 1)
+    assert len(m.generator_table) == m.graph.number_of_nodes()
+    m.reduce_component()
+    gc.collect()
+    assert len(m.generator_table) == m.graph.number_of_nodes()
+
+
+def test_generator_keys():
+    for etangle in (ETangle(ETangle.Type.OVER, (-1, 1, 1), 1), ETangle(ETangle.Type.CAP, (1, -1, 1, -1), 2),
+                    ETangle(ETangle.Type.CUP, (1, -1, 1, -1), 1)):
+        da = type_da(etangle)
+        keys = [x.key for x in da.graph.nodes]
+        assert all(isinstance(key, int) for key in keys)
+        assert len(set(keys)) == len(keys)
+        for key in keys:
+            assert ETangleStrands.from_key(etangle, key).key() == key
+        assert strands_label(etangle)(keys[0]) == str(ETangleStrands.from_key(etangle, keys[0]))
+
+    tangle = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    da = reduced_type_da(tangle, order='tree')
+    x = next(iter(da.graph.nodes))
+    assert strands_label(tangle)(x.key) == ' '.join(str(ETangleStrands.from_key(etangle, key))
+                                                     for etangle, key in zip(tangle.etangles, x.key))
+    assert set(da.to_agraph(label=strands_label(tangle)).nodes()) \
+        == {strands_label(tangle)(x.key) + '[' + str(data['grading'])[1:-1] + ']'
+            for x, data in da.graph.nodes(data=True)}
+
+
+def test_cached_diagrams():
+    etangle = ETangle(ETangle.Type.OVER, (-1, 1, -1), 1)
+    x = ETangleStrands(etangle, {0: 1}, {0: 0, 2: 1, 3: 3})
+    assert x.strand_diagram is x.strand_diagram
+    assert x.left_strand_diagram is x.left_strand_diagram
+    assert x.left_strand_diagram.reflect() is x.left_strand_diagram.reflect()
+    assert x.grading == (x.to_strand_diagram().maslov(), x.to_strand_diagram().twoalexander())
+
+
+def test_crossing_arrays():
+    etangle = ETangle(ETangle.Type.CAP, (-1, 1, -1, 1), 2)
+    for left_strands, right_strands in enumerate_gens([etangle.left_points(), etangle.middle_points(),
+                                                       etangle.right_points()], 2):
+        sd = ETangleStrands(etangle, left_strands, right_strands).to_strand_diagram()
+        assert sd.nobpc() == sum(sd.orange_times_crossed_black(o, b) for o in sd.orange_strands
+                                 if sd.orange_signs[o] == 1 for b in sd.black_strands)
+        assert sd.noonc() == sum(sd.orange_times_crossed_orange(o1, o2) for o1 in sd.orange_strands
+                                 for o2 in sd.orange_strands if sd.orange_signs[o1] == sd.orange_signs[o2] == -1)
+        assert sd.nbbc() == sum(sd.black_times_crossed_black(b1, b2) for b1 in sd.black_strands
+                                for b2 in sd.black_strands) // 2
+
+
+# the recursive enumeration enumerate_gens used to do, kept as a reference for iter_gens
+def reference_gens(points, r=None):
+    sequences = []
+    if len(points) < 2:
+        return sequences
+    for pb in partial_bijections(points[0], points[1], r):
+        coker = [point for point in points[1] if point not in pb.values()]
+        sequences.extend([[pb] + sequence for sequence in reference_gens_helper([coker] + points[2:])])
+    return sequences
+
+
+def reference_gens_helper(points):
+    if len(points) < 2:
+        return [[]]
+    sequences = []
+    for inj in injections(points[0], points[1]):
+        coker = [point for point in points[1] if point not in inj.values()]
+        sequences.extend([[inj] + sequence for sequence in reference_gens_helper([coker] + points[2:])])
+    return sequences
+
+
+def test_iter_gens():
+    points = [['a'], ['b', 'c'], ['d']]
+    assert enumerate_gens(points) == [[{'a': 'b'}, {'c': 'd'}], [{'a': 'c'}, {'b': 'd'}]]
+    assert enumerate_gens(points, 0) == []
+    assert count_gens(points) == 2 and count_gens(points, 0) == 0
+
+    for etangle in (ETangle(ETangle.Type.OVER, (-1, 1, 1), 1), ETangle(ETangle.Type.CAP, (1, -1, 1, -1), 2),
+                    ETangle(ETangle.Type.CUP, (1, -1, 1, -1), 1)):
+        points = [etangle.left_points(), etangle.middle_points(), etangle.right_points()]
+        gens = enumerate_gens(points)
+        assert gens == reference_gens(points)
+        assert count_gens(points) == len(gens)
+        assert enumerate_gens(points, -1) == [] and count_gens(points, -1) == 0
+        for r in range(len(points[0]) + 2):
+            gens = enumerate_gens(points, r)
+            assert gens == reference_gens(points, r)
+            assert count_gens(points, r) == len(gens)
+            assert len({str(gen) for gen in gens}) == len(gens)
+
+
+def test_job_plan():
+    for etangle in (ETangle(ETangle.Type.OVER, (1, -1), 1), ETangle(ETangle.Type.CUP, (-1, 1, -1), 2),
+                    ETangle(ETangle.Type.CAP, (-1, 1, -1), 2)):
+        counts = generator_counts(etangle)
+        for r, count in counts.items():
+            da = type_da_in_left_grading(etangle, r)
+            assert da.graph.number_of_nodes() == count
+            assert idempotent_counts(da) == type_da_idempotent_counts(etangle, r)
+            reduced = idempotent_counts(da.reduce_component())
+            bound = reduced_type_da_idempotent_counts(etangle, r)
+            assert all(reduced[left][right] <= bound[left][right] for left in reduced for right in reduced[left])
+        estimate = estimate_type_da(etangle)
+        assert estimate.generators == sum(counts.values())
+        assert estimate.fits(max_seconds=estimate.seconds) and not estimate.fits(max_bytes=estimate.bytes - 1)
+
+    tangle = ETangle(ETangle.Type.CUP, (1, -1), 1) + ETangle(ETangle.Type.CAP, (1, -1), 1)
+    assert estimate_reduced_type_da(tangle).generators >= reduced_type_da(tangle).graph.number_of_nodes()
+    missing = []
+    counts = piece_idempotent_counts(tangle, 0, missing=missing)
+    assert len(counts) == len(missing) == len(tangle.etangles)
+    assert tuple(etangle for etangle, _ in missing) == tangle.etangles
+
+
+def test_hat_flavor():
+    for etype, signs, position in ((ETangle.Type.OVER, (-1, 1, 1), 1), (ETangle.Type.CUP, (1, -1, 1), 2),
+                                   (ETangle.Type.CAP, (-1, 1, -1), 1)):
+        etangle = ETangle(etype, signs, position)
+        hat_etangle = ETangle(etype, signs, position, hat=True)
+        assert etangle != hat_etangle
+        hat = type_da(hat_etangle)
+        assert all(c.is_one() for _, _, _, c in hat.graph.edge_items())
+        # setting U = 0 in the minus version gives the hat version
+        specialized = empty_type_da(hat_etangle).add_records(type_da(etangle).to_records())
+        _, nodes, edges = hat.to_records()
+        _, specialized_nodes, specialized_edges = specialized.to_records()
+        assert set(nodes) == set(specialized_nodes) and set(edges) == set(specialized_edges)
+
+    tangle = ETangle(ETangle.Type.CUP, (1, -1), 1, hat=True) + ETangle(ETangle.Type.CAP, (1, -1), 1, hat=True)
+    assert reduced_type_da(tangle).graph.number_of_nodes() > 0
+
 # def test_cap():
 #     cap_da = type_da(ETangle(ETangle.Type.CAP, (-1, 1), 1))
 #     cap_da.to_agraph(idempotents=False).draw('output/test_cap.svg')
@@ -1,5 +1,6 @@
 from SignAlgebra.AMinus import AMinus
 from SignAlgebra.TensorAlgebra import TensorAlgebra
+from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Monomial
 
 
 def test_mul():
@@ -45,3 +46,80 @@ def test_tensor_algebra():
     z = ta.zero()
     o = ta.one()
     assert z + (a ** o) ** b == a ** (z + o ** b)
+
+
+def test_packed_polynomials():
+    r = Z2PolynomialRing(['U1', 'U2', 'U3'])
+    u1 = r['U1']
+    u2 = r['U2']
+
+    assert (u1 * u2) * u1 == Z2Monomial(r, {'U1': 2, 'U2': 1}).to_polynomial()
+    assert (u1 + u2) * (u1 + u2) == u1 ** 2 + u2 ** 2
+    assert (u1 * u2) ** 3 == u1 ** 3 * u2 ** 3
+    assert (u1 * u2 ** 2).degree() == 3
+    assert Z2Monomial(r, {'U2': 2, 'U3': 1}).powers == {'U2': 2, 'U3': 1}
+    assert (u1 + u1).is_zero()
+    assert r.one().is_one()
+
+    # polynomials over different rings are different, even with the same variables
+    other = Z2PolynomialRing(['U1', 'U2', 'U3'])
+    assert r.one() != other.one()
+    assert other['U1'] != u1
+
+
+def test_packed_map():
+    source = Z2PolynomialRing(['a', 'b'])
+    target = Z2PolynomialRing(['c'])
+    f = Z2PolynomialRing.Map(source, target, {'a': 'c', 'b': 'c'})
+
+    # a*b and a^2 have the same image, so they cancel
+    assert f.apply(source['a'] * source['b'] + source['a'] ** 2) == target.zero()
+    assert f.apply(source['a'] * source['b']) == target['c'] ** 2
+
+
+def test_multiplication_table():
+    ss = [1, -1, 1]
+    am = AMinus(ss)
+    am.precompute_multiplication_table()
+    untabled = AMinus(ss, table_size=0)
+    bounded = AMinus(ss, table_size=10)
+    for gen1 in am.generators():
+        for gen2 in am.generators():
+            assert gen1 * gen2 == gen1.compute_product(gen2)
+            for algebra in (untabled, bounded):
+                a1 = algebra.generator(gen1.strands)
+                a2 = algebra.generator(gen2.strands)
+                assert a1 * a2 == a1.compute_product(a2)
+    assert len(untabled.multiplication_table) == 0
+    assert len(bounded.multiplication_table) == 10
+
+
+def test_differential_table():
+    am = AMinus([1, -1, 1])
+    am.precompute_differentials()
+    assert len(am.differential_table) == len(am.generators())
+    for gen in am.generators():
+        assert gen.diff() == gen.compute_diff()
+    assert am.d_squared_is_zero()
+    assert AMinus([1, -1, 1], hat=True).d_squared_is_zero()
+
+    # a table that is not a differential is caught
+    gen = next(gen for gen in am.generators() if am.differential(gen).coefficients)
+    am.differential_table[am.idempotent([])] = gen.to_element()
+    assert not am.d_squared_is_zero()
+
+
+def test_accumulator():
+    am = AMinus([1, -1, 1])
+    total = am.zero()
+    accumulator = am.accumulator()
+    for gen in am.generators():
+        d = gen.diff()
+        total += d
+        accumulator += d
+        # adding an element twice cancels it
+        total += gen.to_element() + gen.to_element()
+        accumulator += gen.to_element()
+        accumulator += gen.to_element()
+    assert accumulator.freeze() == total
+    assert all(not c.is_zero() for c in accumulator.coefficients.values())
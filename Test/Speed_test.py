@@ -1,4 +1,11 @@
+import timeit
+
+from multimethod import multimethod
+
 from Modules.CTMinus import type_da
+from SignAlgebra.AMinus import AMinus
+from SignAlgebra.TensorAlgebra import TensorAlgebra
+from SignAlgebra.Z2PolynomialRing import Z2PolynomialRing, Z2Monomial, Z2Polynomial
 from Tangles.Tangle import ETangle
 
 
@@ -10,3 +17,85 @@ def test_da_speed():
     for _ in range(1):
         da = type_da(cup)
     assert True
+
+
+# the operators as they were dispatched before the isinstance fast paths: the same overloads under multimethod, each
+# handing over to the current implementation, so that only the dispatch differs
+class MultimethodMonomial(Z2Monomial):
+    @multimethod
+    def __mul__(self, other):
+        return other.__rmul__(self)
+
+    @multimethod
+    def __mul__(self, other: Z2Monomial) -> Z2Monomial:
+        return Z2Monomial.__mul__(self, other)
+
+
+class MultimethodPolynomial(Z2Polynomial):
+    @multimethod
+    def __mul__(self, other):
+        return other.__rmul__(self)
+
+    @multimethod
+    def __mul__(self, other: Z2Polynomial) -> Z2Polynomial:
+        return Z2Polynomial.__mul__(self, other)
+
+
+class MultimethodGenerator(AMinus.Generator):
+    @multimethod
+    def __rmul__(self, other: Z2Polynomial) -> AMinus.Element:
+        return AMinus.Generator.__rmul__(self, other)
+
+    @multimethod
+    def __rmul__(self, other: AMinus.Element) -> AMinus.Element:
+        return AMinus.Generator.__rmul__(self, other)
+
+
+class MultimethodTensorGenerator(TensorAlgebra.Generator):
+    @multimethod
+    def __pow__(self, other: AMinus.Generator) -> TensorAlgebra.Generator:
+        return TensorAlgebra.Generator.__pow__(self, other)
+
+    @multimethod
+    def __pow__(self, other: AMinus.Element) -> TensorAlgebra.Element:
+        return TensorAlgebra.Generator.__pow__(self, other)
+
+    @multimethod
+    def __pow__(self, other: TensorAlgebra.Generator) -> TensorAlgebra.Generator:
+        return TensorAlgebra.Generator.__pow__(self, other)
+
+    @multimethod
+    def __pow__(self, other):
+        return other.__rpow__(self)
+
+
+# the isinstance paths should beat multimethod by a wide margin; the check only asks for a loose ratio over the
+# best of many runs, so that a loaded machine does not make it fail
+def test_dispatch_speed():
+    r = Z2PolynomialRing(['U1', 'U2'])
+    m1 = Z2Monomial(r, {'U1': 1})
+    m2 = Z2Monomial(r, {'U2': 2})
+    am = AMinus([1, -1])
+    g = am.generator({0: 1})
+    u1 = am.ring['U1']
+    ta = TensorAlgebra(am)
+    t1 = ta.one_generator()
+    t2 = ta.one_generator()
+
+    slow_m1 = MultimethodMonomial(r, {'U1': 1})
+    slow_m2 = MultimethodMonomial(r, {'U2': 2})
+    slow_u1 = MultimethodPolynomial(u1.ring, u1.terms)
+    slow_g = MultimethodGenerator(am, g.strands)
+    slow_t1 = MultimethodTensorGenerator(ta, t1.factors)
+    slow_t2 = MultimethodTensorGenerator(ta, t2.factors)
+    n = 20000
+
+    cases = [('Z2Monomial * Z2Monomial', lambda: m1 * m2, lambda: slow_m1 * slow_m2),
+             ('Z2Polynomial * AMinus.Generator', lambda: u1 * g, lambda: slow_u1 * slow_g),
+             ('TensorAlgebra.Generator ** TensorAlgebra.Generator', lambda: t1 ** t2, lambda: slow_t1 ** slow_t2)]
+    for name, fast, slow in cases:
+        assert fast() == slow()
+        fast_time = min(timeit.repeat(fast, number=n, repeat=10))
+        slow_time = min(timeit.repeat(slow, number=n, repeat=10))
+        print(f"{name}: {1e6 * fast_time / n:.2f}us isinstance vs {1e6 * slow_time / n:.2f}us multimethod")
+        assert fast_time < 0.8 * slow_time
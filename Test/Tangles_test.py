@@ -90,6 +90,16 @@ def test_y_pos():
     assert under.right_y_pos(2) == 1.5
 
 
+def test_orange_strands():
+    assert cup.orange_strands == {1: (None, 1, .5), 2: (None, 1, 1.5)}
+    assert cup.left_orange_strands == {}
+    assert cup.right_orange_strands == {1: (1, .5, .5), 2: (1, 1.5, 1.5)}
+    assert cap.left_orange_strands == {1: (.5, .5, 1), 2: (1.5, 1.5, 1)}
+    assert cap.right_orange_strands == {}
+    assert over.orange_signs == {1: 1, 2: -1}
+    assert over.orange_strands is over.orange_strands
+
+
 def test_comparison():
     assert t1 + t2 == t1 + ETangle(ETangle.Type.CUP, (-1, 1, -1, 1), 3)
 